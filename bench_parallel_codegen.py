@@ -0,0 +1,68 @@
+"""
+Compare parallel 3AC generation against a serial CodeGenerator.
+Usage: python bench_parallel_codegen.py [number of functions] [statements per function]
+"""
+import contextlib
+import io
+import os
+import pickle
+import resource
+import sys
+import time
+
+import parser as pr
+from lexer import Lexer
+from parallel_codegen import generate_parallel, split_units
+from semantic_analyser import CodeGenerator
+
+def make_program(functions, statements):
+    lines = []
+    for i in range(functions):
+        body = " ".join(f"FR int wtl_l{j} = wtl_a * {j} - (wtl_a + {i}) / 3;" for j in range(statements))
+        lines.append(f"FR int wtl_g{i} = {i} * 2 + 1;")
+        lines.append(f"Brew int wtl_f{i}(int wtl_a) {{ {body} spit_it_out wtl_a + wtl_g{i}; }}")
+    return "\n".join(lines)
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def timed(func):
+    """Return wall-clock seconds, CPU seconds of this process and of its worker processes, and the result."""
+    wall, cpu, workers_cpu = time.perf_counter(), time.process_time(), children_cpu()
+    result = func()
+    return (time.perf_counter() - wall, time.process_time() - cpu, children_cpu() - workers_cpu, result)
+
+
+def main():
+    functions = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    statements = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    # The parser and code generator print debugging output for every step
+    with contextlib.redirect_stdout(io.StringIO()):
+        ast = pr.Parser(Lexer(make_program(functions, statements)).tokenize()).parse()
+
+        def serial():
+            code_generator = CodeGenerator()
+            code_generator.generate(ast)
+            return code_generator.code
+
+        serial_wall, _, _, expected = timed(serial)
+        pickled_wall, _, _, _ = timed(lambda: pickle.loads(pickle.dumps(split_units(ast))))
+        runs = [(workers, timed(lambda: generate_parallel(ast, workers))) for workers in (1, 2, 4, 8)]
+
+    print(f"{functions} functions x {statements} statements, {len(expected)} 3AC instructions, "
+          f"{os.cpu_count()} CPUs")
+    print(f"serial CodeGenerator: {serial_wall * 1000:.0f} ms "
+          f"(pickling the units to and from workers would take {pickled_wall * 1000:.0f} ms)")
+    print(f"{'workers':>8} {'wall (ms)':>10} {'speed-up':>9} {'parent CPU (ms)':>16} {'worker CPU (ms)':>16}")
+    for workers, (wall, cpu, workers_cpu, code) in runs:
+        assert code == expected
+        print(f"{workers:>8} {wall * 1000:>10.0f} {serial_wall / wall:>8.2f}x {cpu * 1000:>16.0f} "
+              f"{workers_cpu * 1000:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
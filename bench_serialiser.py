@@ -0,0 +1,87 @@
+"""
+Compare the binary image format against pickle for size and load time.
+Usage: python bench_serialiser.py [number of statements]
+"""
+import contextlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+import parser as pr
+import serialiser
+from lexer import Lexer
+from semantic_analyser import CodeGenerator
+
+def make_program(statements):
+    lines = []
+    for i in range(statements):
+        if i % 2:
+            lines.append(f"spit_it_out wtl_v{i - 1} * {i} - (wtl_v{i - 1} + 7);")
+        else:
+            lines.append(f"FR int wtl_v{i} = {i} * 3 + {i % 11} / 2;")
+    return "\n".join(lines)
+
+
+def best_of(repeats, func):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    statements = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    source = make_program(statements)
+
+    # The parser and code generator print debugging output for every step
+    with contextlib.redirect_stdout(io.StringIO()):
+        tokens = Lexer(source).tokenize()
+        ast = pr.Parser(tokens).parse()
+        code_generator = CodeGenerator()
+        code_generator.generate(ast)
+    code = code_generator.code
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, "program.pickle")
+        image_path = os.path.join(directory, "program.wtlb")
+
+        def dump_pickle():
+            with open(pickle_path, "wb") as f:
+                pickle.dump((tokens, ast, code), f, pickle.HIGHEST_PROTOCOL)
+
+        pickle_dump, _ = best_of(3, dump_pickle)
+        image_dump, _ = best_of(3, lambda: serialiser.dump(image_path, tokens, ast, code))
+
+        def load_pickle():
+            with open(pickle_path, "rb") as f:
+                return pickle.load(f)
+
+        def open_image():
+            image = serialiser.load(image_path)
+            image.close()
+
+        def traverse_image():
+            with serialiser.load(image_path) as image:
+                return image.ast(), list(image.tokens()), image.code()
+
+        pickle_load, (_, _, pickled_code) = best_of(5, load_pickle)
+        image_open, _ = best_of(5, open_image)
+        image_full, (_, _, image_code) = best_of(5, traverse_image)
+        assert image_code == code == pickled_code
+
+        print(f"{statements} statements, {len(tokens)} tokens, {len(code)} 3AC instructions")
+        print(f"{'':>8} {'size (KiB)':>12} {'dump (ms)':>10} {'open (ms)':>10} {'full load (ms)':>15}")
+        print(f"{'pickle':>8} {os.path.getsize(pickle_path) / 1024:>12.1f} {pickle_dump * 1000:>10.2f} "
+              f"{pickle_load * 1000:>10.2f} {pickle_load * 1000:>15.2f}")
+        print(f"{'image':>8} {os.path.getsize(image_path) / 1024:>12.1f} {image_dump * 1000:>10.2f} "
+              f"{image_open * 1000:>10.3f} {image_full * 1000:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
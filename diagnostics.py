@@ -0,0 +1,62 @@
+from bisect import bisect_right
+
+class LineIndex:
+    def __init__(self, source_code):
+        """
+        Map offsets in the source to line and column numbers. The line starts are
+        only found on first use, since most sources lex and parse without errors.
+        :param source_code: The full source text.
+        """
+        self.source_code = source_code
+        self.length = len(source_code)
+        self._line_starts = None
+
+    @property
+    def line_starts(self):
+        """The offset at which every line of the source starts."""
+        if self._line_starts is None:
+            self._line_starts = [0]
+            position = self.source_code.find('\n')
+            while position != -1:
+                self._line_starts.append(position + 1)
+                position = self.source_code.find('\n', position + 1)
+        return self._line_starts
+
+    def location(self, offset):
+        """
+        Resolve a character offset to a 1-based (line, column) pair by bisection.
+        :param offset: Character offset into the source text.
+        """
+        offset = max(0, min(offset, self.length))
+        line = bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+
+class Diagnostic:
+    def __init__(self, message, start, end, line_index=None):
+        """
+        A single error reported while lexing or parsing.
+        :param message: Human readable description of the problem.
+        :param start: Offset of the first character of the offending span.
+        :param end: Offset one past the last character of the span.
+        :param line_index: Optional LineIndex used to resolve line/column positions.
+        """
+        self.message = message
+        self.start = start
+        self.end = end
+        if line_index is not None:
+            self.line, self.column = line_index.location(start)
+            self.end_line, self.end_column = line_index.location(end)
+        else:
+            self.line = self.column = self.end_line = self.end_column = None
+
+    def __repr__(self):
+        if self.line is None:
+            return f"Diagnostic({self.message!r} at {self.start}-{self.end})"
+        return (f"Diagnostic({self.message!r} at {self.line}:{self.column}"
+                f"-{self.end_line}:{self.end_column})")
+
+    def __str__(self):
+        if self.line is None:
+            return f"{self.start}: {self.message}"
+        return f"{self.line}:{self.column}: {self.message}"
@@ -1,56 +1,94 @@
 import re
+from diagnostics import LineIndex, Diagnostic
 
 class LexerError(Exception):
     """Custom exception for lexer errors."""
     pass
 
+TOKEN_SPECIFICATIONS = [
+    ('PRINT', r'spit_it_out'),                   # Print statement
+    ('SCAN', r'gimme_that'),                    # Input statement
+    ('FR', r'FR'),                              # Variable declaration keyword
+    ('DATATYPE', r'int|char|float|double|string|NoCap|Tbh'), # Data types
+    ('FUNCTION', r'Brew'),                      # Function declaration keyword
+    ('RETURN', r'spill'),                       # Return statement
+    ('IF', r'Lowkey'),                          # If statement
+    ('ELSE', r'orNah'),                         # Else statement
+    ('IDENTIFIER', r'wtl_[a-zA-Z_][a-zA-Z0-9_]*'), # Identifier
+    ('NUMBER', r'\d+(\.\d+)?'),                 # Numbers (integers and floats)
+    ('STRING', r'"[^"]*"'),                     # Strings
+    ('CHAR', r"'.'"),                           # Character
+    ('ASSIGN', r'='),                           # Assignment operator
+    ('SEMICOLON', r';'),                        # Semicolon
+    ('COMMA', r','),                            # Parameter separator
+    ('LPAREN', r'\('),                          # Left parenthesis
+    ('RPAREN', r'\)'),                          # Right parenthesis
+    ('LBRACE', r'\{'),                          # Left brace
+    ('RBRACE', r'\}'),                          # Right brace
+    ('OPERATOR', r'[+\-*/]'),                   # Arithmetic operators
+    ('WHITESPACE', r'[ \t\n]+'),                # Whitespace (ignored)
+    ('INVALID', r'.'),                          # Any invalid token
+]
+
+TOKEN_REGEX = re.compile('|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in TOKEN_SPECIFICATIONS))
+
 class Lexer:
-    def __init__(self, source_code):
+    def __init__(self, source_code, recover=False):
+        """
+        :param source_code: The source text to tokenize.
+        :param recover: If True, invalid characters become ERROR tokens and are
+                        recorded in self.errors instead of raising LexerError.
+        """
         self.source_code = source_code
         self.tokens = []
         self.position = 0
+        self.recover = recover
+        self.errors = []
+        self.line_index = LineIndex(source_code)  # Only scans for lines once an error needs a position
 
     def tokenize(self):
         """
-        Tokenizes the source code into a list of tokens.
+        Tokenizes the source code into a list of (kind, value, offset) tokens.
         """
-        token_specifications = [
-            ('PRINT', r'spit_it_out'),                   # Print statement
-            ('SCAN', r'gimme_that'),                    # Input statement
-            ('FR', r'FR'),                              # Variable declaration keyword
-            ('DATATYPE', r'int|char|float|double|string|NoCap|Tbh'), # Data types
-            ('FUNCTION', r'Brew'),                      # Function declaration keyword
-            ('RETURN', r'spill'),                       # Return statement
-            ('IF', r'Lowkey'),                          # If statement
-            ('ELSE', r'orNah'),                         # Else statement
-            ('IDENTIFIER', r'wtl_[a-zA-Z_][a-zA-Z0-9_]*'), # Identifier
-            ('NUMBER', r'\d+(\.\d+)?'),                 # Numbers (integers and floats)
-            ('STRING', r'"[^"]*"'),                     # Strings
-            ('CHAR', r"'.'"),                           # Character
-            ('ASSIGN', r'='),                           # Assignment operator
-            ('SEMICOLON', r';'),                        # Semicolon
-            ('LPAREN', r'\('),                          # Left parenthesis
-            ('RPAREN', r'\)'),                          # Right parenthesis
-            ('LBRACE', r'\{'),                          # Left brace
-            ('RBRACE', r'\}'),                          # Right brace
-            ('OPERATOR', r'[+\-*/]'),                   # Arithmetic operators
-            ('WHITESPACE', r'[ \t\n]+'),                # Whitespace (ignored)
-            ('INVALID', r'.'),                          # Any invalid token
-        ]
-
-        token_regex = '|'.join(f'(?P<{pair[0]}>{pair[1]})' for pair in token_specifications)
-        regex = re.compile(token_regex)
-
-        for match in regex.finditer(self.source_code):
+        self.tokens.extend(self.iter_tokens())
+        return self.tokens
+
+    def iter_tokens(self, start=0):
+        """
+        Lazily tokenize the source code from the given offset onwards, yielding
+        (kind, value, offset) tokens. Offsets are always relative to the start of
+        the source, so a caller can re-lex just the part of a file that changed.
+        """
+        error = None  # Pending (value, offset) of a run of adjacent invalid characters
+
+        for match in TOKEN_REGEX.finditer(self.source_code, start):
             kind = match.lastgroup
             value = match.group(kind)
+            self.position = match.start()
 
-            if kind == 'WHITESPACE':
-                continue  # Ignore whitespace
-            elif kind == 'INVALID':
-                raise LexerError(f"Your Syntax is sus T_T at position {self.position}: {value}")
-            else:
-                self.tokens.append((kind, value))
-            self.position += len(value)
+            if kind == 'INVALID':
+                if not self.recover:
+                    line, column = self.line_index.location(self.position)
+                    raise LexerError(f"Your Syntax is sus T_T at line {line}, column {column}: {value}")
+                if error and error[1] + len(error[0]) == self.position:
+                    error = (error[0] + value, error[1])  # Merge into a single error token
+                else:
+                    if error:
+                        yield self.error_token(*error)
+                    error = (value, self.position)
+                continue
+            if error:
+                yield self.error_token(*error)
+                error = None
+            if kind != 'WHITESPACE':  # Ignore whitespace
+                yield (kind, value, self.position)
 
-        return self.tokens
+        if error:
+            yield self.error_token(*error)
+        self.position = len(self.source_code)
+
+    def error_token(self, value, offset):
+        """Record a diagnostic for a run of invalid characters and return its ERROR token."""
+        self.errors.append(Diagnostic(f"Your Syntax is sus T_T: {value}", offset, offset + len(value),
+                                      self.line_index))
+        return ('ERROR', value, offset)
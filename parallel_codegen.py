@@ -0,0 +1,175 @@
+import gc
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import parser as pr
+from semantic_analyser import CodeGenerator
+
+# Temporaries (t1), labels (label1) and if-exits (end_if_1) are numbered from the
+# CodeGenerator's counters. String literals are matched first so their contents
+# are never renumbered.
+_NUMBERED_NAME = re.compile(r'"[^"]*"|\b(t|label|end_if_)(\d+)\b')
+_LINE_SEPARATOR = '\x00'  # Joins a unit's lines; string literals may contain newlines
+_FIELD_START = '\x01'  # Stand-ins for '{' and '}' around the format fields of a template
+_FIELD_END = '\x02'
+_STRING_LITERAL = re.compile(r'"[^"]*"')
+_shared_units = None  # The units being compiled, inherited by worker processes when they fork
+
+class CompiledUnit:
+    def __init__(self, template, line_count, temps_used, labels_used):
+        """
+        The 3AC for one compilation unit, numbered as if it were compiled alone.
+        :param template: The unit's lines joined by _LINE_SEPARATOR, as a format string
+                         in which temp n is written t{0[n]} and label n label{1[n]}.
+        :param line_count: Number of 3AC lines in the unit.
+        :param temps_used: How far the unit advanced the temp counter.
+        :param labels_used: How far the unit advanced the label counter.
+        """
+        self.template = template
+        self.line_count = line_count
+        self.temps_used = temps_used
+        self.labels_used = labels_used
+
+    def text(self, temp_offset, label_offset):
+        """Return the unit's lines, joined by _LINE_SEPARATOR, with numbers shifted by the given offsets."""
+        return self.template.format(range(temp_offset, sys.maxsize), range(label_offset, sys.maxsize))
+
+    def renumbered(self, temp_offset, label_offset):
+        """Return the unit's 3AC with every temp and label number shifted by the given offsets."""
+        if not self.line_count:
+            return []
+        return self.text(temp_offset, label_offset).split(_LINE_SEPARATOR)
+
+
+class TemplateCodeGenerator(CodeGenerator):
+    """A CodeGenerator that writes temp and label numbers as fields of a CompiledUnit template."""
+
+    def temp_name(self, number):
+        return f"t{_FIELD_START}0[{number}]{_FIELD_END}"
+
+    def label_name(self, prefix, number):
+        return f"{prefix}{_FIELD_START}1[{number}]{_FIELD_END}"
+
+
+def number_template(code):
+    """Turn plain 3AC lines into a CompiledUnit template by matching their temp and label names."""
+    def field(match):
+        prefix = match.group(1)
+        if prefix is None:
+            return match.group(0)  # String literal, left untouched
+        return f"{prefix}{{{0 if prefix == 't' else 1}[{match.group(2)}]}}"
+
+    text = _LINE_SEPARATOR.join(code).replace('{', '{{').replace('}', '}}')
+    return _NUMBERED_NAME.sub(field, text)
+
+
+def namespace_numbers(code, namespace):
+    """
+    Move every temp and label in the given 3AC lines into a namespace of their
+    own (t3 becomes t12_3 in namespace 12), so units compiled separately can be
+    concatenated without renumbering any of them.
+    """
+    def qualify(match):
+        prefix = match.group(1)
+        if prefix is None:
+            return match.group(0)  # String literal, left untouched
+        return f"{prefix}{namespace}_{match.group(2)}"
+
+    return [_NUMBERED_NAME.sub(qualify, line) for line in code]
+
+
+def split_units(ast):
+    """
+    Split a program into independent compilation units, in source order.
+    Every FuncDeclNode is a unit of its own; runs of other top-level
+    statements between functions are grouped into one unit each.
+    """
+    units = []
+    pending = []
+    for node in ast:
+        if isinstance(node, pr.FuncDeclNode):
+            if pending:
+                units.append(pending)
+                pending = []
+            units.append([node])
+        else:
+            pending.append(node)
+    if pending:
+        units.append(pending)
+    return units
+
+
+def compile_unit(nodes):
+    """Lower one unit with a fresh generator, so its temps and labels start at 1."""
+    code_generator = TemplateCodeGenerator()
+    code_generator.generate(nodes)
+    text = _LINE_SEPARATOR.join(code_generator.code)
+    if '"' not in text or not any(_FIELD_START in literal or _FIELD_END in literal
+                                  for literal in _STRING_LITERAL.findall(text)):
+        template = (text.replace('{', '{{').replace('}', '}}')
+                    .replace(_FIELD_START, '{').replace(_FIELD_END, '}'))
+    else:
+        # A string literal contains one of the stand-in characters, so match names instead
+        plain_generator = CodeGenerator()
+        plain_generator.generate(nodes)
+        template = number_template(plain_generator.code)
+    return CompiledUnit(template, len(code_generator.code),
+                        code_generator.temp_counter - 1, code_generator.label_counter - 1)
+
+
+def link(units):
+    """
+    Merge compiled units in source order, renumbering each one's temps and
+    labels so the result is identical to compiling the whole program serially.
+    """
+    texts = []
+    temp_offset = label_offset = 0
+    for unit in units:
+        if unit.line_count:
+            texts.append(unit.text(temp_offset, label_offset))
+        temp_offset += unit.temps_used
+        label_offset += unit.labels_used
+    return _LINE_SEPARATOR.join(texts).split(_LINE_SEPARATOR) if texts else []
+
+
+def compile_units(bounds):
+    """Lower the units in the given (start, stop) range of the units shared at fork."""
+    start, stop = bounds
+    return [compile_unit(unit) for unit in _shared_units[start:stop]]
+
+
+def generate_parallel(ast, max_workers=None):
+    """
+    Generate 3AC for a whole program, lowering its compilation units
+    concurrently on a process pool.
+    :param ast: The list of top-level statements returned by Parser.parse().
+    :param max_workers: Size of the process pool; defaults to the number of CPUs.
+    :return: The 3AC lines, byte-identical to CodeGenerator.generate(ast).
+    """
+    global _shared_units
+    units = split_units(ast)
+    workers = max_workers or os.cpu_count() or 1
+    if workers == 1 or len(units) < 2 or 'fork' not in multiprocessing.get_all_start_methods():
+        # One generator numbers every unit in turn, so there is nothing to renumber
+        code_generator = CodeGenerator()
+        code_generator.generate(ast)
+        return code_generator.code
+
+    # Workers inherit the AST when they fork, so only unit ranges are sent to them and
+    # only unit templates come back; pickling the AST itself costs more than lowering it
+    chunks = min(len(units), workers * 4)
+    bounds = [(len(units) * i // chunks, len(units) * (i + 1) // chunks) for i in range(chunks)]
+    _shared_units = units
+    # Keep the inherited objects out of the workers' garbage collections, which would
+    # otherwise touch (and so copy) every page of the AST in every worker
+    gc.freeze()
+    try:
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as executor:
+            compiled = [unit for chunk in executor.map(compile_units, bounds) for unit in chunk]
+    finally:
+        gc.unfreeze()
+        _shared_units = None
+    return link(compiled)
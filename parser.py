@@ -1,10 +1,14 @@
 from lexer import Lexer, LexerError
+from diagnostics import Diagnostic
 from collections import deque
 
 class ParserError(Exception):
     """Custom exception for parser errors."""
     pass
 
+# Token kinds that can only begin a statement, used as recovery points
+STATEMENT_KEYWORDS = ('PRINT', 'SCAN', 'FR', 'FUNCTION')
+
 # AST Node Definitions
 class ASTNode:
     pass
@@ -144,19 +148,96 @@ class ScanStmtNode:
 
 # Updated Parser Class
 class Parser:
-    def __init__(self, tokens):
+    def __init__(self, tokens, recover=False, line_index=None):
+        """
+        :param tokens: Tokens produced by the Lexer.
+        :param recover: If True, syntax errors are recorded in self.errors and the
+                        parser re-synchronises on ';' or '}' instead of raising.
+        :param line_index: Optional LineIndex used to give diagnostics line/column spans.
+        """
         self.tokens = deque(tokens)  # Initialize as a deque
+        self.recover = recover
+        self.line_index = line_index
+        self.errors = []
+        self.depth = 0  # Number of enclosing blocks, so recovery leaves their '}' alone
+        self.consumed = 0  # Number of tokens advanced past, used to detect stalls
+        self.end_offset = 0  # Offset just past the last token seen, for end-of-input errors
         self.current_token = None
         self.advance()  # Set the first token
 
     def advance(self):
         # Safely fetch the next token or set None if empty
-        if self.tokens:  # Check if there are tokens left
-            self.current_token = self.tokens.popleft()  # Move to the next token
-        else:
-            self.current_token = None  # No more tokens, end of input
+        self.current_token = None  # No more tokens, end of input
+        while self.tokens:  # Check if there are tokens left
+            token = self.tokens.popleft()  # Move to the next token
+            if len(token) > 2:
+                self.end_offset = token[2] + len(token[1])
+            if token[0] != 'ERROR':  # Error tokens were already reported by the lexer
+                self.current_token = token
+                break
+        self.consumed += 1
         print(f"Advanced to next token: {self.current_token}")
 
+    def peek_kind(self):
+        """Return the kind of the current token, or None at the end of input."""
+        return self.current_token[0] if self.current_token is not None else None
+
+    def unexpected(self):
+        """Build the error for a token that cannot start or continue the current construct."""
+        if self.current_token is None:
+            return ParserError("Unexpected end of input")
+        return ParserError("Syntax error: unexpected token '{}'".format(self.current_token[1]))
+
+    def report(self, message):
+        """Record a diagnostic spanning the current token (or the end of input)."""
+        if self.current_token is not None and len(self.current_token) > 2:
+            start = self.current_token[2]
+            end = start + len(self.current_token[1])
+        else:
+            start = end = self.end_offset
+        self.errors.append(Diagnostic(message, start, end, self.line_index))
+
+    def synchronize(self):
+        """
+        Panic-mode recovery: skip tokens up to and including the next ';' or '}'.
+        A '{' met while skipping opens a block that belongs to the broken statement,
+        so its contents are parsed (to report their own errors) and the statement
+        ends at the matching '}'.
+        """
+        while self.current_token is not None:
+            kind = self.peek_kind()
+            if kind == 'RBRACE' and self.depth:
+                break  # Let the enclosing block consume its closing brace
+            self.advance()
+            if kind == 'LBRACE':
+                self.block()
+                if self.peek_kind() == 'RBRACE':
+                    self.advance()
+                break
+            if kind in ('SEMICOLON', 'RBRACE'):
+                break
+
+    def recovering_statement(self):
+        """
+        Parse a statement, recording any syntax error and re-synchronising.
+        Returns None if the statement could not be parsed.
+        """
+        consumed = self.consumed
+        try:
+            return self.statement()
+        except ParserError as e:
+            self.report(str(e))
+        if self.current_token is None:
+            return None
+        if self.peek_kind() == 'RBRACE' and self.depth:
+            pass  # Leave the closing brace for the enclosing block
+        elif self.peek_kind() in ('SEMICOLON', 'RBRACE'):
+            self.advance()  # The terminator itself was the offending token
+        elif self.consumed == consumed or self.peek_kind() not in STATEMENT_KEYWORDS:
+            self.synchronize()
+        # Otherwise a new statement starts here (e.g. after a missing ';'), so resume at it
+        return None
+
     def consume(self, expected_token_type, error_message=None):
         """
         Ensures the current token matches the expected type and advances to the next token.
@@ -164,13 +245,15 @@ class Parser:
         :param error_message: Custom error message if the token type does not match.
         :raises ParserError: If the current token does not match the expected type.
         """
-        if self.current_token[0] == expected_token_type:
+        if self.peek_kind() == expected_token_type:
             self.advance()  # Consume and move to the next token
         else:
             if error_message:
                 raise ParserError(error_message)
+            elif self.current_token is None:
+                raise ParserError(f"Expected '{expected_token_type}', but reached the end of input")
             else:
-                raise ParserError(f"Expected '{expected_token_type}', but found '{self.current_token}'")
+                raise ParserError(f"Expected '{expected_token_type}', but found '{self.current_token[1]}'")
 
     def next_token(self):
         if self.tokens:
@@ -186,32 +269,37 @@ class Parser:
         """Parse the program: a list of statements."""
         statements = []
         while self.current_token:
-            statements.append(self.statement())
+            if self.recover:
+                statement = self.recovering_statement()
+                if statement is not None:
+                    statements.append(statement)
+            else:
+                statements.append(self.statement())
         return statements
 
     def statement(self):
         """Parse a statement, which could be different types."""
-        if self.current_token[0] == 'PRINT':
+        if self.peek_kind() == 'PRINT':
             return self.print_stmt()
-        elif self.current_token[0] == 'SCAN':
+        elif self.peek_kind() == 'SCAN':
             return self.scan_stmt()
-        elif self.current_token[0] == 'FR':
+        elif self.peek_kind() == 'FR':
             return self.var_decl()
-        elif self.current_token[0] == 'Brew':
+        elif self.peek_kind() == 'FUNCTION':
             return self.func_decl()
-        elif self.current_token[0] == 'Lowkey':
+        elif self.peek_kind() == 'Lowkey':
             return self.if_stmt()
-        elif self.current_token[0] == 'IDENTIFIER':
+        elif self.peek_kind() == 'IDENTIFIER':
             return self.assignment_stmt()
         else:
-            raise ParserError("Syntax error: unexpected token '{}'".format(self.current_token[1]))
+            raise self.unexpected()
 
     def print_stmt(self):
         """Parse a print statement."""
         self.advance()  # Skip 'PRINT'
     
         # Check if it's a string literal
-        if self.current_token[0] == 'STRING':
+        if self.peek_kind() == 'STRING':
             string_value = self.current_token[1]
             #print(string_value)
             self.advance()  # Skip the string token
@@ -235,6 +323,12 @@ class Parser:
         # Parse the right-hand side (RHS) expression
         rhs = self.expr()             # Assuming expr() parses the right-hand side
 
+        # Consume the semicolon
+        if self.peek_kind() == "SEMICOLON":
+            self.consume("SEMICOLON")
+        else:
+            raise ParserError("Expected ';' at the end of assignment")
+
         # Return an AST node for the assignment
         return AssignmentNode(lhs, rhs)
 
@@ -243,17 +337,10 @@ class Parser:
         """Parse an expression (handles addition and subtraction)."""
         left = self.term()  # Start with the first term
 
-        while self.current_token and self.current_token[0] in   ('OPERATOR') and self.current_token[1] in ('+', '-'):
+        while self.current_token and self.peek_kind() in   ('OPERATOR') and self.current_token[1] in ('+', '-'):
             operator = self.current_token[1]
             self.advance()  # Skip operator
-
-            # If the current token is an identifier, handle it  as a variable use
-            if self.current_token[0] == 'IDENTIFIER':
-                var_name = self.current_token[1]  # Get the     name of the variable
-                left = VarUseNode(var_name)  # Create a  VarUseNode for variable usage
-                self.advance()  # Consume the identifier token
-            else:
-               right = self.term()  # Otherwise, continue  parsing the right side of the expression
+            right = self.term()  # Parse the right side of the expression, identifiers included
 
             # Handle the addition or subtraction
             if operator == '+':
@@ -266,7 +353,7 @@ class Parser:
     def term(self):
         """Parse a term (handles multiplication, division, and modulus)."""
         left = self.factor()
-        while self.current_token and self.current_token[0] in ('OPERATOR') and self.current_token[1] in ('*', '/', '%'):
+        while self.current_token and self.peek_kind() in ('OPERATOR') and self.current_token[1] in ('*', '/', '%'):
             operator = self.current_token[1]
             self.advance()  # Skip operator
             right = self.factor()
@@ -280,58 +367,60 @@ class Parser:
 
     def factor(self):
         """Parse a factor (handles parentheses, numbers, and identifiers)."""
-        if self.current_token[0] == 'NUMBER':
+        if self.peek_kind() == 'NUMBER':
             value = self.current_token[1]
             self.advance()
             return NumberNode(value)
-        elif self.current_token[0] == 'IDENTIFIER':
+        elif self.peek_kind() == 'IDENTIFIER':
             name = self.current_token[1]
             self.advance()
             return IdentifierNode(name)
-        elif self.current_token[0] == 'LPAREN':
+        elif self.peek_kind() == 'LPAREN':
             self.advance()
             expr = self.expr()
             self.expect('RPAREN')
             return expr
         else:
-            raise ParserError("Syntax error: unexpected token '{}'".format(self.current_token[1]))
+            raise self.unexpected()
 
     def expect(self, token_type):
         """Helper to expect a certain token type and advance."""
-        if self.current_token and self.current_token[0] == token_type:
+        if self.current_token and self.peek_kind() == token_type:
             value = self.current_token[1]
             self.advance()
             return value
+        elif self.current_token is None:
+            raise ParserError(f"Expected '{token_type}', but reached the end of input")
         else:
-            raise ParserError(f"Expected '{token_type}', but found '{self.current_token}'")
+            raise ParserError(f"Expected '{token_type}', but found '{self.current_token[1]}'")
     
     def var_decl(self):
         """
         Parse a variable declaration.
         Example: FR int x = 10;
         """
-        if self.current_token[0] == "FR":
+        if self.peek_kind() == "FR":
             self.consume("FR")  # Consume 'FR'
 
             # Parse the data type
-            if self.current_token[0] == "DATATYPE":
-                data_type = self.current_token[0]
+            if self.peek_kind() == "DATATYPE":
+                data_type = self.peek_kind()
                 self.consume("DATATYPE")  # Consume the data type
 
                 # Parse the variable name
-                if self.current_token[0] == "IDENTIFIER":
+                if self.peek_kind() == "IDENTIFIER":
                     var_name = self.current_token[1]
                     self.consume("IDENTIFIER")
 
                     # Parse the assignment (optional)
-                    if self.current_token[0] == "ASSIGN":
+                    if self.peek_kind() == "ASSIGN":
                         self.consume("ASSIGN")
                         value = self.expr()  # Parse the expression after '='
                     else:
                         value = None  # No value assigned
 
                     # Consume the semicolon
-                    if self.current_token[0] == "SEMICOLON":
+                    if self.peek_kind() == "SEMICOLON":
                         self.consume("SEMICOLON")
                     else:
                         raise ParserError("Expected ';' at the end of variable declaration")
@@ -345,21 +434,64 @@ class Parser:
         else:
             raise ParserError("Expected 'FR' for variable declaration")
 
+    def block(self):
+        """
+        Parse the statements of a block up to (but not including) its closing '}'.
+        Example: { FR int x = 1; spit_it_out x; }
+        """
+        statements = []
+        self.depth += 1
+        try:
+            while self.current_token and self.peek_kind() != "RBRACE":
+                if self.recover:
+                    statement = self.recovering_statement()
+                    if statement is not None:
+                        statements.append(statement)
+                else:
+                    statements.append(self.statement())
+        finally:
+            self.depth -= 1
+        return statements
+
+    def param_list(self):
+        """
+        Parse a possibly empty, comma separated parameter list.
+        Example: int x, float y
+        Returns a list of (data_type, name) tuples.
+        """
+        params = []
+        if self.current_token and self.peek_kind() == "RPAREN":
+            return params
+        while True:
+            if self.peek_kind() == "DATATYPE":
+                data_type = self.current_token[1]
+                self.consume("DATATYPE")
+            else:
+                raise ParserError("Expected parameter type (e.g., int, float)")
+            if self.peek_kind() == "IDENTIFIER":
+                params.append((data_type, self.current_token[1]))
+                self.consume("IDENTIFIER")
+            else:
+                raise ParserError("Expected parameter name")
+            if self.peek_kind() != "COMMA":
+                return params
+            self.consume("COMMA")
+
     def scan_stmt(self):
         """
         Parse an input statement.
         Example: SCAN x;
         """
-        if self.current_token[0] == "SCAN":
+        if self.peek_kind() == "SCAN":
             self.consume("SCAN")  # Consume 'SCAN'
 
             # Parse the variable name
-            if self.current_token[0] == "IDENTIFIER":
+            if self.peek_kind() == "IDENTIFIER":
                 var_name = self.current_token[1]
                 self.consume("IDENTIFIER")
 
                 # Consume the semicolon
-                if self.current_token[0] == "SEMICOLON":
+                if self.peek_kind() == "SEMICOLON":
                     self.consume("SEMICOLON")
                     return ScanStmtNode(var_name)  # Return a ScanStmtNode
                 else:
@@ -375,28 +507,28 @@ class Parser:
         Parse a function declaration.
         Example: Brew int foo() { ... }
         """
-        if self.current_token[0] == "Brew":
-            self.consume("Brew")  # Consume 'Brew'
+        if self.peek_kind() == "FUNCTION":
+            self.consume("FUNCTION")  # Consume 'Brew'
 
             # Parse the return type
-            if self.current_token[0] in ["int", "float", "void"]:
-                return_type = self.current_token[0]
-                self.consume(return_type)
+            if self.peek_kind() == "DATATYPE":
+                return_type = self.current_token[1]
+                self.consume("DATATYPE")
             else:
                 raise ParserError("Expected return type (e.g., int, float)")
 
             # Parse the function name
-            if self.current_token[0] == "IDENTIFIER":
+            if self.peek_kind() == "IDENTIFIER":
                 func_name = self.current_token[1]
                 self.consume("IDENTIFIER")
             else:
                 raise ParserError("Expected function name")
 
             # Parse the parameter list
-            if self.current_token[0] == "LPAREN":
+            if self.peek_kind() == "LPAREN":
                 self.consume("LPAREN")  # Consume '('
                 params = self.param_list()  # Parse the parameter list
-                if self.current_token[0] == "RPAREN":
+                if self.peek_kind() == "RPAREN":
                     self.consume("RPAREN")  # Consume ')'
                 else:
                     raise ParserError("Expected ')' after parameter list")
@@ -404,10 +536,10 @@ class Parser:
                 raise ParserError("Expected '(' after function name")
 
             # Parse the function body
-            if self.current_token[0] == "LBRACE":
+            if self.peek_kind() == "LBRACE":
                 self.consume("LBRACE")  # Consume '{'
                 body = self.block()  # Parse the block of statements
-                if self.current_token[0] == "RBRACE":
+                if self.peek_kind() == "RBRACE":
                     self.consume("RBRACE")  # Consume '}'
                 else:
                     raise ParserError("Expected '}' after function body")
@@ -422,14 +554,14 @@ class Parser:
         Parse an if statement.
         Example: Lowkey (x < 10) { ... } Else { ... }
         """
-        if self.current_token[0] == "Lowkey":
+        if self.peek_kind() == "Lowkey":
             self.consume("Lowkey")  # Consume 'Lowkey'
 
             # Parse the condition
-            if self.current_token[0] == "LPAREN":
+            if self.peek_kind() == "LPAREN":
                 self.consume("LPAREN")  # Consume '('
                 condition = self.expr()  # Parse the condition expression
-                if self.current_token[0] == "RPAREN":
+                if self.peek_kind() == "RPAREN":
                     self.consume("RPAREN")  # Consume ')'
                 else:
                     raise ParserError("Expected ')' after condition")
@@ -437,10 +569,10 @@ class Parser:
                 raise ParserError("Expected '(' after 'Lowkey'")
 
             # Parse the 'then' block
-            if self.current_token[0] == "LBRACE":
+            if self.peek_kind() == "LBRACE":
                 self.consume("LBRACE")  # Consume '{'
                 if_block = self.block()  # Parse the block of statements
-                if self.current_token[0] == "RBRACE":
+                if self.peek_kind() == "RBRACE":
                     self.consume("RBRACE")  # Consume '}'
                 else:
                     raise ParserError("Expected '}' after 'then' block")
@@ -449,12 +581,12 @@ class Parser:
 
             # Parse the 'else' block (optional)
             else_block = None
-            if self.current_token and self.current_token[0] == "Else":
+            if self.current_token and self.peek_kind() == "Else":
                 self.consume("Else")  # Consume 'Else'
-                if self.current_token[0] == "LBRACE":
+                if self.peek_kind() == "LBRACE":
                     self.consume("LBRACE")  # Consume '{'
                     else_block = self.block()  # Parse the block of statements
-                    if self.current_token[0] == "RBRACE":
+                    if self.peek_kind() == "RBRACE":
                         self.consume("RBRACE")  # Consume '}'
                     else:
                         raise ParserError("Expected '}' after 'else' block")
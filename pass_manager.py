@@ -0,0 +1,464 @@
+import math
+import re
+import time
+
+from tac import Instruction, OPERATOR_SYMBOLS, format_code, parse_instruction
+
+class PassError(Exception):
+    """Custom exception for misconfigured pass pipelines."""
+    pass
+
+# Used by passes that change nothing an analysis depends on
+PRESERVE_ALL = ('*',)
+
+_TEMP = re.compile(r'^t\d+(_\d+)?$')  # t1, or t12_1 when namespaced per unit
+_NUMBER = re.compile(r'^\d+(\.\d+)?$')
+_WORD = re.compile(r'[A-Za-z_]\w*')
+
+def is_temp(operand):
+    """Compiler-generated temporaries (t1, t2, ...) are never visible outside the unit that defines them."""
+    return operand is not None and _TEMP.match(operand) is not None
+
+def is_constant(operand):
+    return operand is not None and (_NUMBER.match(operand) is not None or operand.startswith('"'))
+
+def is_variable(operand):
+    return operand is not None and not is_constant(operand)
+
+def instruction_uses(instruction):
+    """Variables read by an instruction; RAW lines are assumed to read every word they contain."""
+    if instruction.op == 'RAW':
+        return set(_WORD.findall(instruction.a))
+    return {operand for operand in instruction.uses() if is_variable(operand)}
+
+
+# Analyses
+
+class Analysis:
+    """Base class for analyses. Subclasses set name and requires and implement run()."""
+    name = None
+    requires = ()
+
+    def run(self, code, analyses):
+        raise NotImplementedError
+
+
+class ControlFlowGraph:
+    def __init__(self, blocks, successors, entries):
+        """
+        :param blocks: (start, end) instruction ranges of every basic block, in order.
+        :param successors: For each block, the indices of the blocks it can jump or fall to.
+        :param entries: Blocks where execution can begin (the program and each function).
+        """
+        self.blocks = blocks
+        self.successors = successors
+        self.entries = entries
+
+    def __eq__(self, other):
+        return (isinstance(other, ControlFlowGraph) and self.blocks == other.blocks
+                and self.successors == other.successors and sorted(self.entries) == sorted(other.entries))
+
+    def reachable(self):
+        """Return the set of blocks reachable from any entry."""
+        seen = set()
+        stack = list(self.entries)
+        while stack:
+            block = stack.pop()
+            if block not in seen:
+                seen.add(block)
+                stack.extend(self.successors[block])
+        return seen
+
+
+class CFGAnalysis(Analysis):
+    name = 'cfg'
+
+    def run(self, code, analyses):
+        # Match each function with its end so top-level code can flow around it
+        function_end = {}
+        stack = []
+        for index, instruction in enumerate(code):
+            if instruction.op == 'FUNC':
+                stack.append(index)
+            elif instruction.op == 'ENDFUNC' and stack:
+                function_end[stack.pop()] = index
+
+        leaders = {0} if code else set()
+        for index, instruction in enumerate(code):
+            if instruction.op in ('LABEL', 'FUNC'):
+                leaders.add(index)
+            if instruction.op in ('GOTO', 'IF_GOTO', 'ENDFUNC') and index + 1 < len(code):
+                leaders.add(index + 1)
+            if instruction.op == 'FUNC' and index in function_end and function_end[index] + 1 < len(code):
+                leaders.add(function_end[index] + 1)
+        starts = sorted(leaders)
+        blocks = [(start, end) for start, end in zip(starts, starts[1:] + [len(code)])]
+        block_at = {start: number for number, (start, _) in enumerate(blocks)}
+        label_block = {code[start].dst: number for number, (start, _) in enumerate(blocks)
+                       if code[start].op == 'LABEL'}
+
+        def skip_functions(index):
+            """Top-level flow skips over function bodies, including several in a row."""
+            while index < len(code) and code[index].op == 'FUNC':
+                index = function_end.get(index, len(code) - 1) + 1
+            return index
+
+        program_start = skip_functions(0)
+        entries = [block_at[program_start]] if program_start < len(code) else []
+        entries += [block_at[index] for index, instruction in enumerate(code) if instruction.op == 'FUNC']
+        successors = []
+        for number, (start, end) in enumerate(blocks):
+            last = code[end - 1]
+            following = skip_functions(end)
+            targets = []
+            if last.op in ('GOTO', 'IF_GOTO') and last.dst in label_block:
+                targets.append(label_block[last.dst])
+            if last.op not in ('GOTO', 'ENDFUNC') and following < len(code):
+                targets.append(block_at[following])
+            successors.append(targets)
+        return ControlFlowGraph(blocks, successors, entries)
+
+
+class LivenessAnalysis(Analysis):
+    name = 'liveness'
+    requires = ('cfg',)
+
+    def run(self, code, analyses):
+        """Return, for every instruction, the set of variables live after it."""
+        cfg = analyses.get('cfg', code)
+        live_in = [set() for _ in cfg.blocks]
+        changed = True
+        while changed:
+            changed = False
+            for number in reversed(range(len(cfg.blocks))):
+                start, end = cfg.blocks[number]
+                live = set()
+                for successor in cfg.successors[number]:
+                    live |= live_in[successor]
+                for index in reversed(range(start, end)):
+                    live.discard(code[index].defines())
+                    live |= instruction_uses(code[index])
+                if live != live_in[number]:
+                    live_in[number] = live
+                    changed = True
+
+        live_out = [None] * len(code)
+        for number, (start, end) in enumerate(cfg.blocks):
+            live = set()
+            for successor in cfg.successors[number]:
+                live |= live_in[successor]
+            for index in reversed(range(start, end)):
+                live_out[index] = set(live)
+                live.discard(code[index].defines())
+                live |= instruction_uses(code[index])
+        return live_out
+
+
+class SymbolResolution(Analysis):
+    name = 'symbols'
+
+    def run(self, code, analyses):
+        """Map every variable to the indices of the instructions that define and use it."""
+        symbols = {}
+        for index, instruction in enumerate(code):
+            defined = instruction.defines()
+            if defined is not None:
+                symbols.setdefault(defined, ([], []))[0].append(index)
+            for name in instruction_uses(instruction):
+                symbols.setdefault(name, ([], []))[1].append(index)
+        return symbols
+
+
+class TypeInference(Analysis):
+    name = 'types'
+
+    def run(self, code, analyses):
+        """
+        Infer 'int', 'float' or 'string' for every variable from its definitions.
+        Variables with conflicting or unknown definitions map to None.
+        """
+        types = {}
+        for instruction in code:
+            defined = instruction.defines()
+            if defined is None:
+                continue
+            if instruction.op in OPERATOR_SYMBOLS:
+                left, right = operand_type(instruction.a, types), operand_type(instruction.b, types)
+                inferred = 'float' if 'float' in (left, right) else left if left == right else None
+            else:
+                inferred = operand_type(instruction.a, types)
+            if defined in types and types[defined] != inferred:
+                inferred = None
+            types[defined] = inferred
+        return types
+
+
+def operand_type(operand, types):
+    if operand is None:
+        return None
+    elif operand.startswith('"'):
+        return 'string'
+    elif _NUMBER.match(operand):
+        return 'float' if '.' in operand else 'int'
+    return types.get(operand)
+
+
+ANALYSES = {analysis.name: analysis for analysis in
+            (CFGAnalysis(), LivenessAnalysis(), SymbolResolution(), TypeInference())}
+
+
+class AnalysisManager:
+    def __init__(self, analyses=None):
+        """
+        Computes analyses on demand and caches them until a pass invalidates them.
+        :param analyses: Mapping of analysis name to Analysis; defaults to ANALYSES.
+        """
+        self.analyses = dict(ANALYSES if analyses is None else analyses)
+        self.cache = {}
+        self.stats = {}  # name -> [times computed, total seconds]
+
+    def get(self, name, code):
+        """Return the named analysis for the given code, computing it if it is not cached."""
+        if name not in self.cache:
+            if name not in self.analyses:
+                raise PassError(f"Unknown analysis '{name}'")
+            start = time.perf_counter()
+            self.cache[name] = self.analyses[name].run(code, self)
+            stats = self.stats.setdefault(name, [0, 0.0])
+            stats[0] += 1
+            stats[1] += time.perf_counter() - start
+        return self.cache[name]
+
+    def invalidate(self, preserved):
+        """Drop every cached analysis that is not preserved, along with anything built on it."""
+        if preserved == PRESERVE_ALL:
+            return
+        dropped = [name for name in self.cache if name not in preserved]
+        while dropped:
+            for name in dropped:
+                del self.cache[name]
+            dropped = [name for name in self.cache
+                       if any(required not in self.cache for required in self.analyses[name].requires)]
+
+
+# Transformation passes
+
+class Pass:
+    """
+    Base class for transformations. requires lists the analyses the pass reads;
+    preserves lists the analyses still valid after it runs (PRESERVE_ALL for all).
+    """
+    name = None
+    requires = ()
+    preserves = ()
+
+    def run(self, code, analyses):
+        """Return the transformed list of Instructions."""
+        raise NotImplementedError
+
+
+class ConstantFolding(Pass):
+    name = 'constant-folding'
+    requires = ('symbols', 'types')
+    preserves = ('cfg', 'types')
+
+    def run(self, code, analyses):
+        symbols = analyses.get('symbols', code)
+        types = analyses.get('types', code)
+        constants = {}
+        result = []
+        for instruction in code:
+            if instruction.op in OPERATOR_SYMBOLS:
+                a = constants.get(instruction.a, instruction.a)
+                b = constants.get(instruction.b, instruction.b)
+                folded = fold(instruction.op, a, b, types.get(instruction.dst))
+                if folded is not None:
+                    instruction = Instruction('COPY', instruction.dst, folded)
+                elif (a, b) != (instruction.a, instruction.b):
+                    instruction = Instruction(instruction.op, instruction.dst, a, b)
+            if (instruction.op == 'COPY' and is_temp(instruction.dst) and _NUMBER.match(instruction.a)
+                    and len(symbols.get(instruction.dst, ([], []))[0]) == 1):
+                constants[instruction.dst] = instruction.a
+            result.append(instruction)
+        return result
+
+
+def fold(op, a, b, result_type):
+    """Evaluate a binary operation on two numeric literals, or return None if it can't be folded."""
+    if not (_NUMBER.match(a) and _NUMBER.match(b)):
+        return None
+    is_float = result_type == 'float' or '.' in a or '.' in b
+    x, y = (float(a), float(b)) if is_float else (int(a), int(b))
+    if op in ('DIV', 'MOD') and y == 0:
+        return None  # Leave the run-time error in place
+    if op == 'ADD':
+        value = x + y
+    elif op == 'SUB':
+        value = x - y
+    elif op == 'MUL':
+        value = x * y
+    elif is_float:
+        value = x / y if op == 'DIV' else math.fmod(x, y)
+    else:
+        # C-style integer division truncates towards zero and the remainder takes the dividend's sign
+        quotient = abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1)
+        value = quotient if op == 'DIV' else x - y * quotient
+    text = repr(float(value)) if is_float else str(value)
+    if not _NUMBER.match(text):
+        return None  # Negative numbers, exponents and inf/nan have no literal form in the language
+    return text
+
+
+class CopyPropagation(Pass):
+    name = 'copy-propagation'
+    requires = ('symbols',)
+    preserves = ('cfg', 'types')
+
+    def run(self, code, analyses):
+        symbols = analyses.get('symbols', code)
+
+        def single_definition(name):
+            return is_temp(name) and len(symbols.get(name, ([], []))[0]) == 1
+
+        # Temps assigned exactly once from a literal or another such temp can be replaced by their source
+        copies = {}
+        for instruction in code:
+            if (instruction.op == 'COPY' and single_definition(instruction.dst)
+                    and (is_constant(instruction.a) or single_definition(instruction.a))):
+                copies[instruction.dst] = copies.get(instruction.a, instruction.a)
+
+        result = []
+        for instruction in code:
+            if instruction.op in OPERATOR_SYMBOLS or instruction.op in ('COPY', 'PRINT', 'IF_GOTO'):
+                a = copies.get(instruction.a, instruction.a)
+                b = copies.get(instruction.b, instruction.b)
+                if (a, b) != (instruction.a, instruction.b):
+                    instruction = Instruction(instruction.op, instruction.dst, a, b)
+            result.append(instruction)
+        return result
+
+
+class DeadCodeElimination(Pass):
+    name = 'dead-code-elimination'
+    requires = ('cfg', 'liveness')
+
+    def run(self, code, analyses):
+        cfg = analyses.get('cfg', code)
+        live_out = analyses.get('liveness', code)
+        keep = [True] * len(code)
+        for start, end in cfg.blocks:
+            # Sweep each block backwards so chains of dead temps disappear in one pass
+            live = set(live_out[end - 1])
+            for index in reversed(range(start, end)):
+                defined = code[index].defines()
+                if is_temp(defined) and defined not in live:
+                    keep[index] = False
+                    continue
+                live.discard(defined)
+                live |= instruction_uses(code[index])
+        return [instruction for index, instruction in enumerate(code) if keep[index]]
+
+
+class UnreachableCodeElimination(Pass):
+    name = 'unreachable-code-elimination'
+    requires = ('cfg',)
+
+    def run(self, code, analyses):
+        cfg = analyses.get('cfg', code)
+        reachable = cfg.reachable()
+        result = []
+        for number, (start, end) in enumerate(cfg.blocks):
+            if number in reachable:
+                result.extend(code[start:end])
+        return result
+
+
+class PassRecord:
+    def __init__(self, name, seconds, before, after):
+        """Timing and instruction counts for one pass execution."""
+        self.name = name
+        self.seconds = seconds
+        self.before = before
+        self.after = after
+
+    def __repr__(self):
+        return f"PassRecord({self.name}, {self.seconds * 1000:.3f} ms, {self.before} -> {self.after})"
+
+
+class PassManager:
+    def __init__(self, passes, verify=False):
+        """
+        Runs a sequence of passes over 3AC, sharing cached analyses between them.
+        :param passes: List of Pass instances, run in order.
+        :param verify: Recompute every analysis a pass claims to preserve and raise
+                       PassError if it differs from the cached result (slow; for testing).
+        """
+        self.passes = passes
+        self.verify = verify
+        self.analyses = AnalysisManager()
+        self.records = []
+
+    def run(self, code):
+        """
+        Optimise 3AC code.
+        :param code: List of 3AC lines (as in CodeGenerator.code) or tac.Instructions.
+        :return: The optimised code as a list of 3AC lines.
+        """
+        code = [line if isinstance(line, Instruction) else parse_instruction(line) for line in code]
+        self.analyses.cache.clear()
+        for current in self.passes:
+            before = len(code)
+            start = time.perf_counter()
+            for name in current.requires:
+                self.analyses.get(name, code)
+            code = current.run(code, self.analyses)
+            self.analyses.invalidate(current.preserves)
+            if self.verify:
+                self.check_preserved(current, code)
+            self.records.append(PassRecord(current.name, time.perf_counter() - start, before, len(code)))
+        return format_code(code)
+
+    def check_preserved(self, current, code):
+        """Raise PassError if an analysis kept in the cache no longer matches the code."""
+        fresh = AnalysisManager(self.analyses.analyses)
+        for name, cached in self.analyses.cache.items():
+            if fresh.get(name, code) != cached:
+                raise PassError(f"Pass '{current.name}' claims to preserve '{name}' but changed it")
+
+    def report(self):
+        """Return a human readable summary of pass timings and analysis reuse."""
+        lines = [f"{'pass':<30} {'time (ms)':>10} {'before':>8} {'after':>8} {'delta':>8}"]
+        for record in self.records:
+            lines.append(f"{record.name:<30} {record.seconds * 1000:>10.3f} {record.before:>8} "
+                         f"{record.after:>8} {record.after - record.before:>+8}")
+        for name, (computed, seconds) in sorted(self.analyses.stats.items()):
+            lines.append(f"analysis {name:<21} {seconds * 1000:>10.3f}  computed {computed}x")
+        return "\n".join(lines)
+
+
+OPTIMIZATION_LEVELS = {
+    0: lambda: [],
+    1: lambda: [ConstantFolding(), DeadCodeElimination()],
+    2: lambda: [CopyPropagation(), ConstantFolding(), CopyPropagation(), DeadCodeElimination(),
+                UnreachableCodeElimination(), DeadCodeElimination()],
+}
+
+def build_pipeline(level, verify=False):
+    """
+    Build the PassManager for an optimisation level.
+    :param level: 0, 1 or 2, or the equivalent flag ('-O0', '-O1', '-O2').
+    :param verify: Passed to PassManager.
+    """
+    if isinstance(level, str):
+        match = re.match(r'^-?O(\d)$', level)
+        if not match:
+            raise PassError(f"Invalid optimisation level '{level}'")
+        level = int(match.group(1))
+    if level not in OPTIMIZATION_LEVELS:
+        raise PassError(f"Invalid optimisation level '{level}', expected 0, 1 or 2")
+    return PassManager(OPTIMIZATION_LEVELS[level](), verify)
+
+
+def optimize(code, level=1):
+    """Run the standard pipeline for the given optimisation level over 3AC code."""
+    return build_pipeline(level).run(code)
@@ -49,6 +49,14 @@ class CodeGenerator:
         for node in ast:
             self.visit(node)
 
+    def temp_name(self, number):
+        """Name of the temporary variable with the given number."""
+        return f"t{number}"
+
+    def label_name(self, prefix, number):
+        """Name of a label ('label' or 'end_if_') with the given number."""
+        return f"{prefix}{number}"
+
     def visit(self, node):
         print(f"Visiting node: {type(node)}")  # Debugging line to print node type
 
@@ -68,7 +76,7 @@ class CodeGenerator:
 
         elif isinstance(node, pr.VarDeclNode):
             # Variable declaration in 3AC
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             expr_code = self.visit(node.expr)
             self.code.append(f"{temp_var} = {expr_code}")
@@ -86,7 +94,7 @@ class CodeGenerator:
             # Arithmetic addition: t1 = t2 + t3
             left_code = self.visit(node.left)
             right_code = self.visit(node.right)
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             self.code.append(f"{temp_var} = {left_code} + {right_code}")
             return temp_var
@@ -95,7 +103,7 @@ class CodeGenerator:
             # Arithmetic subtraction: t1 = t2 - t3
             left_code = self.visit(node.left)
             right_code = self.visit(node.right)
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             self.code.append(f"{temp_var} = {left_code} - {right_code}")
             return temp_var
@@ -104,7 +112,7 @@ class CodeGenerator:
             # Arithmetic multiplication: t1 = t2 * t3
             left_code = self.visit(node.left)
             right_code = self.visit(node.right)
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             self.code.append(f"{temp_var} = {left_code} * {right_code}")
             return temp_var
@@ -113,7 +121,7 @@ class CodeGenerator:
             # Arithmetic division: t1 = t2 / t3
             left_code = self.visit(node.left)
             right_code = self.visit(node.right)
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             self.code.append(f"{temp_var} = {left_code} / {right_code}")
             return temp_var
@@ -122,16 +130,25 @@ class CodeGenerator:
             # Arithmetic modulus: t1 = t2 % t3
             left_code = self.visit(node.left)
             right_code = self.visit(node.right)
-            temp_var = f"t{self.temp_counter}"
+            temp_var = self.temp_name(self.temp_counter)
             self.temp_counter += 1
             self.code.append(f"{temp_var} = {left_code} % {right_code}")
             return temp_var
 
+        elif isinstance(node, pr.FuncDeclNode):
+            # Function declaration: func f / param x ... / body / endfunc f
+            self.code.append(f"func {node.func_name}")
+            for data_type, param_name in node.params:
+                self.code.append(f"param {param_name}")
+            for stmt in node.body:
+                self.visit(stmt)
+            self.code.append(f"endfunc {node.func_name}")
+
         elif isinstance(node, pr.IfNode):
             # If-Else condition handling
             cond_code = self.visit(node.condition)
-            true_label = f"label{self.label_counter}"
-            false_label = f"label{self.label_counter + 1}"
+            true_label = self.label_name("label", self.label_counter)
+            false_label = self.label_name("label", self.label_counter + 1)
             self.label_counter += 2
 
             self.code.append(f"if {cond_code} goto {true_label}")
@@ -140,50 +157,51 @@ class CodeGenerator:
             # Process the true block
             for stmt in node.true_block:
                 self.visit(stmt)
-            self.code.append(f"goto end_if_{self.label_counter}")
+            self.code.append(f"goto {self.label_name('end_if_', self.label_counter)}")
 
             self.code.append(f"{false_label}:")
             # Process the false block
             for stmt in node.false_block:
                 self.visit(stmt)
 
-            self.code.append(f"end_if_{self.label_counter}:")
+            self.code.append(f"{self.label_name('end_if_', self.label_counter)}:")
 
 # Example usage:
-lexer = Lexer("FR int wtl_x=7;")
-tokens = lexer.tokenize()
-print(tokens)
-
-
-try:
-    parser = pr.Parser(tokens)
-    print("Parsing tokens...")
-    ast = parser.parse()
-    print("AST generated successfully:")
-    for node in ast:
-        print(type(node), node.__dict__)
-except Exception as e:
-    print("Error during parsing:", e)
-    raise
-
-try:
-    print("Running semantic checks...")
-    semantic_checker = SemanticChecker()
-    semantic_checker.check(ast)
-    print("Semantic analysis completed successfully.")
-except Exception as e:
-    print("Error during semantic analysis:", e)
-    raise
-
-try:
-    print("Generating 3AC code...")
-    code_generator = CodeGenerator()
-    code_generator.generate(ast)
-    print("Generated 3AC Code:")
-    print("\n".join(code_generator.code))
-except Exception as e:
-    print("Error during code generation:", e)
-    raise
+if __name__ == "__main__":
+    lexer = Lexer("FR int wtl_x=7;")
+    tokens = lexer.tokenize()
+    print(tokens)
+
+
+    try:
+        parser = pr.Parser(tokens)
+        print("Parsing tokens...")
+        ast = parser.parse()
+        print("AST generated successfully:")
+        for node in ast:
+            print(type(node), node.__dict__)
+    except Exception as e:
+        print("Error during parsing:", e)
+        raise
+
+    try:
+        print("Running semantic checks...")
+        semantic_checker = SemanticChecker()
+        semantic_checker.check(ast)
+        print("Semantic analysis completed successfully.")
+    except Exception as e:
+        print("Error during semantic analysis:", e)
+        raise
+
+    try:
+        print("Generating 3AC code...")
+        code_generator = CodeGenerator()
+        code_generator.generate(ast)
+        print("Generated 3AC Code:")
+        print("\n".join(code_generator.code))
+    except Exception as e:
+        print("Error during code generation:", e)
+        raise
 
 """ parser = pr.Parser(tokens)
 ast = parser.parse()
@@ -0,0 +1,402 @@
+import mmap
+import struct
+import sys
+from array import array
+
+import parser as pr
+from tac import Instruction, OPCODES, parse_instruction
+
+class SerialisationError(Exception):
+    """Custom exception for malformed or unsupported binary images."""
+    pass
+
+# File layout (all integers little-endian):
+#   header         : magic, format version, section count
+#   section table  : one (section id, record count, offset, size) entry per section
+#   sections       : each starts on an 8-byte boundary
+# Records are packed without padding; they are read with struct, not cast in place.
+# Sections of u32 words are cast in place on little-endian hosts and decoded into
+# a copy on big-endian ones, so images are portable between the two.
+MAGIC = b'WTLB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHH')
+SECTION_ENTRY = struct.Struct('<IIQQ')
+
+# Section ids
+STRING_OFFSETS = 1  # count + 1 u32 offsets into STRING_DATA
+STRING_DATA = 2     # UTF-8 bytes of every string, back to back
+TOKEN_KINDS = 3     # string index of each distinct token kind, as u32 words
+TOKENS = 4          # TOKEN_RECORD per token
+NODES = 5           # NODE_RECORD per AST node, children before parents
+LISTS = 6           # u32 words: a header (count | TUPLE_FLAG) followed by (tag, value) pairs
+ROOTS = 7           # u32 node index per top-level statement
+CODE = 8            # INSTRUCTION_RECORD per 3AC instruction
+
+TOKEN_RECORD = struct.Struct('<BII')            # index into TOKEN_KINDS, value, source offset
+NODE_RECORD = struct.Struct('<BBIIII')          # node type, four 2-bit slot tags, four slot values
+INSTRUCTION_RECORD = struct.Struct('<BIII')     # opcode, dst, a, b
+
+# The u32 word sections can be cast in place when the host's native words are little-endian
+NATIVE_WORDS = sys.byteorder == 'little' and array('I').itemsize == 4
+
+NONE = 0xFFFFFFFF  # Stands in for a missing string or token offset
+TUPLE_FLAG = 0x80000000  # Set in a list header when the value was a tuple
+
+# Slot tags
+TAG_NONE = 0
+TAG_NODE = 1
+TAG_STRING = 2
+TAG_LIST = 3
+
+# Node types and the attributes stored in their slots. The index of each entry
+# is written to the image, so new node types must only ever be appended.
+NODE_SCHEMA = [
+    (pr.PrintNode, ('expr',)),
+    (pr.StringNode, ('value',)),
+    (pr.AssignmentNode, ('lhs', 'rhs')),
+    (pr.VarDeclNode, ('data_type', 'var_name', 'expr')),
+    (pr.VarUseNode, ('var_name',)),
+    (pr.IfNode, ('condition', 'if_block', 'else_block')),
+    (pr.FuncDeclNode, ('return_type', 'func_name', 'params', 'body')),
+    (pr.ExprNode, ('left', 'operator', 'right')),
+    (pr.NumberNode, ('value',)),
+    (pr.IdentifierNode, ('name',)),
+    (pr.AddNode, ('left', 'right')),
+    (pr.SubNode, ('left', 'right')),
+    (pr.MulNode, ('left', 'right')),
+    (pr.DivNode, ('left', 'right')),
+    (pr.ModNode, ('left', 'right')),
+    (pr.ScanStmtNode, ('var_name',)),
+]
+NODE_TYPE_IDS = {node_class: index for index, (node_class, _) in enumerate(NODE_SCHEMA)}
+OPCODE_IDS = {op: index for index, op in enumerate(OPCODES)}
+
+
+def word_bytes(words):
+    """Encode a sequence of u32 words as little-endian bytes."""
+    if NATIVE_WORDS:
+        return (words if isinstance(words, array) else array('I', words)).tobytes()
+    return struct.pack(f'<{len(words)}I', *words)
+
+
+class Writer:
+    def __init__(self):
+        self.strings = {}
+        self.string_data = bytearray()
+        self.string_offsets = array('I', [0])
+        self.token_kinds = {}
+        self.tokens = bytearray()
+        self.nodes = bytearray()
+        self.node_count = 0
+        self.lists = array('I')
+        self.roots = array('I')
+        self.code = bytearray()
+
+    def string(self, value):
+        """Intern a string and return its index in the string table."""
+        if value is None:
+            return NONE
+        index = self.strings.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings[value] = index
+            self.string_data += value.encode('utf-8')
+            self.string_offsets.append(len(self.string_data))
+        return index
+
+    def slot(self, value):
+        """Encode an attribute value as a (tag, value) pair."""
+        if value is None:
+            return TAG_NONE, 0
+        elif isinstance(value, str):
+            return TAG_STRING, self.string(value)
+        elif isinstance(value, (list, tuple)):
+            items = [self.slot(item) for item in value]
+            start = len(self.lists)
+            self.lists.append(len(items) | (TUPLE_FLAG if isinstance(value, tuple) else 0))
+            for tag, item in items:
+                self.lists.append(tag)
+                self.lists.append(item)
+            return TAG_LIST, start
+        elif type(value) in NODE_TYPE_IDS:
+            return TAG_NODE, self.node(value)
+        else:
+            raise SerialisationError(f"Cannot serialise value of type {type(value).__name__}")
+
+    def node(self, node):
+        """Append an AST node (after its children) and return its index."""
+        type_id = NODE_TYPE_IDS[type(node)]
+        fields = NODE_SCHEMA[type_id][1]
+        tags = 0
+        values = [0] * 4
+        for position, field in enumerate(fields):
+            tag, values[position] = self.slot(getattr(node, field))
+            tags |= tag << (2 * position)
+        self.nodes += NODE_RECORD.pack(type_id, tags, *values)
+        self.node_count += 1
+        return self.node_count - 1
+
+    def add_tokens(self, tokens):
+        for token in tokens:
+            offset = token[2] if len(token) > 2 else NONE
+            kind = self.token_kinds.get(token[0])
+            if kind is None:
+                kind = self.token_kinds[token[0]] = len(self.token_kinds)
+            self.tokens += TOKEN_RECORD.pack(kind, self.string(token[1]), offset)
+
+    def add_ast(self, ast):
+        for node in ast:
+            self.roots.append(self.node(node))
+
+    def add_code(self, instructions):
+        for instruction in instructions:
+            self.code += INSTRUCTION_RECORD.pack(OPCODE_IDS[instruction.op], self.string(instruction.dst),
+                                                 self.string(instruction.a), self.string(instruction.b))
+
+    def to_bytes(self):
+        kinds = [self.string(kind) for kind in self.token_kinds]
+        sections = [
+            (STRING_OFFSETS, len(self.strings), word_bytes(self.string_offsets)),
+            (STRING_DATA, len(self.string_data), bytes(self.string_data)),
+            (TOKEN_KINDS, len(self.token_kinds), word_bytes(kinds)),
+            (TOKENS, len(self.tokens) // TOKEN_RECORD.size, bytes(self.tokens)),
+            (NODES, self.node_count, bytes(self.nodes)),
+            (LISTS, len(self.lists), word_bytes(self.lists)),
+            (ROOTS, len(self.roots), word_bytes(self.roots)),
+            (CODE, len(self.code) // INSTRUCTION_RECORD.size, bytes(self.code)),
+        ]
+        out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        table_offset = len(out)
+        out += bytes(SECTION_ENTRY.size * len(sections))
+        for position, (section_id, count, data) in enumerate(sections):
+            out += bytes(-len(out) % 8)  # Align every section to 8 bytes
+            SECTION_ENTRY.pack_into(out, table_offset + position * SECTION_ENTRY.size,
+                                    section_id, count, len(out), len(data))
+            out += data
+        return bytes(out)
+
+
+def dumps(tokens=None, ast=None, code=None):
+    """
+    Serialise any combination of Lexer tokens, a parsed AST and CodeGenerator
+    output into the binary image format.
+    :param code: 3AC as a list of lines or a list of tac.Instruction objects.
+    """
+    writer = Writer()
+    if tokens is not None:
+        writer.add_tokens(tokens)
+    if ast is not None:
+        writer.add_ast(ast)
+    if code is not None:
+        writer.add_code([line if isinstance(line, Instruction) else parse_instruction(line) for line in code])
+    return writer.to_bytes()
+
+
+def dump(path, tokens=None, ast=None, code=None):
+    """Write a binary image to the given path."""
+    with open(path, 'wb') as f:
+        f.write(dumps(tokens, ast, code))
+
+
+def loads(data):
+    """Open an image held in memory (bytes, bytearray or memoryview) without copying it."""
+    return Image(memoryview(data))
+
+
+def load(path):
+    """
+    Memory-map an image from disk. Only the header is read up front; everything
+    else is decoded lazily as it is accessed. Close the image when done.
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return Image(memoryview(mapping), mapping)
+
+
+class NodeView:
+    __slots__ = ('_image', '_index', 'node_type')
+
+    def __init__(self, image, index):
+        """A lazily decoded AST node; attributes are read from the image on access."""
+        self._image = image
+        self._index = index
+        self.node_type = NODE_SCHEMA[image._node_type(index)][0]
+
+    def __getattr__(self, name):
+        fields = NODE_SCHEMA[NODE_TYPE_IDS[self.node_type]][1]
+        if name not in fields:
+            raise AttributeError(f"{self.node_type.__name__} has no attribute '{name}'")
+        return self._image._node_slot(self._index, fields.index(name), lazy=True)
+
+    def __repr__(self):
+        return f"NodeView({self.node_type.__name__}, index={self._index})"
+
+    def materialize(self):
+        """Decode this node and all of its children into parser AST objects."""
+        return self._image._materialize(self._index)
+
+
+class Image:
+    def __init__(self, buffer, mapping=None):
+        self._buffer = buffer
+        self._mapping = mapping
+        self._strings = {}
+        if len(buffer) < HEADER.size:
+            raise SerialisationError("Image is too small to contain a header")
+        magic, version, section_count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise SerialisationError("Not a WhatTheLang binary image")
+        if version != FORMAT_VERSION:
+            raise SerialisationError(f"Unsupported image format version {version}")
+        self._sections = {}
+        for position in range(section_count):
+            section_id, count, offset, size = SECTION_ENTRY.unpack_from(
+                buffer, HEADER.size + position * SECTION_ENTRY.size)
+            if offset + size > len(buffer):
+                raise SerialisationError(f"Section {section_id} runs past the end of the image")
+            self._sections[section_id] = (count, offset, size)
+        self._string_offsets = self._words(STRING_OFFSETS)
+        self._string_data = self._section_view(STRING_DATA)
+        self._token_kinds = self._words(TOKEN_KINDS)
+        self._lists = self._words(LISTS)
+        self._roots = self._words(ROOTS)
+        self._nodes_offset = self._sections.get(NODES, (0, 0, 0))[1]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the underlying buffer (and the memory map, if any)."""
+        for view in (self._string_offsets, self._string_data, self._token_kinds, self._lists, self._roots, self._buffer):
+            view.release()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+
+    def _section_view(self, section_id):
+        count, offset, size = self._sections.get(section_id, (0, 0, 0))
+        return self._buffer[offset:offset + size]
+
+    def _words(self, section_id):
+        view = self._section_view(section_id)
+        if view.nbytes % 4:
+            raise SerialisationError(f"Section {section_id} is not a whole number of words")
+        if NATIVE_WORDS:
+            return view.cast('I')
+        words = memoryview(array('L', struct.unpack(f'<{view.nbytes // 4}I', view)))
+        view.release()
+        return words
+
+    def _count(self, section_id):
+        return self._sections.get(section_id, (0, 0, 0))[0]
+
+    @property
+    def token_count(self):
+        return self._count(TOKENS)
+
+    @property
+    def node_count(self):
+        return self._count(NODES)
+
+    @property
+    def instruction_count(self):
+        return self._count(CODE)
+
+    def string(self, index):
+        """Return the string at the given index of the string table."""
+        if index == NONE:
+            return None
+        value = self._strings.get(index)
+        if value is None:
+            start, end = self._string_offsets[index], self._string_offsets[index + 1]
+            value = str(self._string_data[start:end], 'utf-8')
+            self._strings[index] = value
+        return value
+
+    def token(self, index):
+        """Return the token at the given index as a (kind, value, offset) tuple."""
+        if not 0 <= index < self.token_count:
+            raise IndexError("token index out of range")
+        kind, value, offset = TOKEN_RECORD.unpack_from(
+            self._buffer, self._sections[TOKENS][1] + index * TOKEN_RECORD.size)
+        kind = self.string(self._token_kinds[kind])
+        if offset == NONE:
+            return (kind, self.string(value))
+        return (kind, self.string(value), offset)
+
+    def tokens(self):
+        """Iterate over every token in the image."""
+        for index in range(self.token_count):
+            yield self.token(index)
+
+    def _node_record(self, index):
+        if not 0 <= index < self.node_count:
+            raise IndexError("node index out of range")
+        return NODE_RECORD.unpack_from(self._buffer, self._nodes_offset + index * NODE_RECORD.size)
+
+    def _node_type(self, index):
+        type_id = self._node_record(index)[0]
+        if type_id >= len(NODE_SCHEMA):
+            raise SerialisationError(f"Unknown node type {type_id}")
+        return type_id
+
+    def _node_slot(self, index, position, lazy):
+        record = self._node_record(index)
+        return self._decode((record[1] >> (2 * position)) & 3, record[2 + position], lazy)
+
+    def _decode(self, tag, value, lazy):
+        if tag == TAG_NONE:
+            return None
+        elif tag == TAG_STRING:
+            return self.string(value)
+        elif tag == TAG_NODE:
+            return NodeView(self, value) if lazy else self._materialize(value)
+        header = self._lists[value]
+        items = [self._decode(self._lists[value + 1 + 2 * i], self._lists[value + 2 + 2 * i], lazy)
+                 for i in range(header & ~TUPLE_FLAG)]
+        return tuple(items) if header & TUPLE_FLAG else items
+
+    def _materialize(self, index):
+        record = self._node_record(index)
+        if record[0] >= len(NODE_SCHEMA):
+            raise SerialisationError(f"Unknown node type {record[0]}")
+        node_class, fields = NODE_SCHEMA[record[0]]
+        node = node_class.__new__(node_class)
+        tags = record[1]
+        for position, field in enumerate(fields):
+            setattr(node, field, self._decode((tags >> (2 * position)) & 3, record[2 + position], lazy=False))
+        return node
+
+    def node(self, index):
+        """Return a lazily decoded view of the node at the given index."""
+        return NodeView(self, index)
+
+    def roots(self):
+        """Return lazy views of the top-level statements."""
+        return [NodeView(self, index) for index in self._roots]
+
+    def ast(self):
+        """Decode the whole AST into parser node objects."""
+        return [self._materialize(index) for index in self._roots]
+
+    def instruction(self, index):
+        """Return the 3AC instruction at the given index."""
+        if not 0 <= index < self.instruction_count:
+            raise IndexError("instruction index out of range")
+        opcode, dst, a, b = INSTRUCTION_RECORD.unpack_from(
+            self._buffer, self._sections[CODE][1] + index * INSTRUCTION_RECORD.size)
+        if opcode >= len(OPCODES):
+            raise SerialisationError(f"Unknown opcode {opcode}")
+        return Instruction(OPCODES[opcode], self.string(dst), self.string(a), self.string(b))
+
+    def instructions(self):
+        """Iterate over every 3AC instruction in the image."""
+        for index in range(self.instruction_count):
+            yield self.instruction(index)
+
+    def code(self):
+        """Return the 3AC as a list of lines, matching CodeGenerator.code."""
+        return [instruction.format() for instruction in self.instructions()]
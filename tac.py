@@ -0,0 +1,119 @@
+import re
+
+# Three-address code opcodes. The numeric values are stored in serialised
+# images, so new opcodes must only ever be appended.
+OPCODES = ['RAW', 'LABEL', 'GOTO', 'IF_GOTO', 'PRINT', 'COPY', 'ADD', 'SUB', 'MUL', 'DIV', 'MOD',
+           'FUNC', 'PARAM', 'ENDFUNC']
+
+BINARY_OPERATORS = {'+': 'ADD', '-': 'SUB', '*': 'MUL', '/': 'DIV', '%': 'MOD'}
+OPERATOR_SYMBOLS = {op: symbol for symbol, op in BINARY_OPERATORS.items()}
+
+# An operand is either a string literal (which may contain spaces) or a single word
+_OPERAND = r'("[^"]*"|[^\s"]+)'
+_PATTERNS = [
+    ('LABEL', re.compile(r'^([^\s:]+):$')),
+    ('GOTO', re.compile(r'^goto (\S+)$')),
+    ('FUNC', re.compile(r'^func (\S+)$')),
+    ('PARAM', re.compile(r'^param (\S+)$')),
+    ('ENDFUNC', re.compile(r'^endfunc (\S+)$')),
+    ('IF_GOTO', re.compile(rf'^if {_OPERAND} goto (\S+)$')),
+    ('PRINT', re.compile(rf'^print {_OPERAND}$')),
+    ('BINARY', re.compile(rf'^(\S+) = {_OPERAND} ([+\-*/%]) {_OPERAND}$')),
+    ('COPY', re.compile(rf'^(\S+) = {_OPERAND}$')),
+]
+
+class Instruction:
+    def __init__(self, op, dst=None, a=None, b=None):
+        """
+        A single three-address code instruction.
+        :param op: One of OPCODES.
+        :param dst: Destination variable, the jump target for LABEL/GOTO/IF_GOTO,
+                    or the function/parameter name for FUNC/PARAM/ENDFUNC.
+        :param a: First operand (the full line for RAW instructions).
+        :param b: Second operand of a binary operation.
+        """
+        self.op = op
+        self.dst = dst
+        self.a = a
+        self.b = b
+
+    def __repr__(self):
+        return f"Instruction({self.op}, dst={self.dst}, a={self.a}, b={self.b})"
+
+    def __eq__(self, other):
+        return (isinstance(other, Instruction) and self.op == other.op and self.dst == other.dst
+                and self.a == other.a and self.b == other.b)
+
+    def uses(self):
+        """Return the operands read by this instruction."""
+        if self.op in OPERATOR_SYMBOLS:
+            return [self.a, self.b]
+        elif self.op in ('COPY', 'PRINT', 'IF_GOTO'):
+            return [self.a]
+        return []
+
+    def defines(self):
+        """Return the variable written by this instruction, if any."""
+        if self.op in ('COPY', 'PARAM') or self.op in OPERATOR_SYMBOLS:
+            return self.dst
+        return None
+
+    def format(self):
+        """Render the instruction back to its textual 3AC form."""
+        if self.op == 'LABEL':
+            return f"{self.dst}:"
+        elif self.op == 'GOTO':
+            return f"goto {self.dst}"
+        elif self.op == 'FUNC':
+            return f"func {self.dst}"
+        elif self.op == 'PARAM':
+            return f"param {self.dst}"
+        elif self.op == 'ENDFUNC':
+            return f"endfunc {self.dst}"
+        elif self.op == 'IF_GOTO':
+            return f"if {self.a} goto {self.dst}"
+        elif self.op == 'PRINT':
+            return f"print {self.a}"
+        elif self.op == 'COPY':
+            return f"{self.dst} = {self.a}"
+        elif self.op in OPERATOR_SYMBOLS:
+            return f"{self.dst} = {self.a} {OPERATOR_SYMBOLS[self.op]} {self.b}"
+        return self.a
+
+
+def parse_instruction(line):
+    """
+    Parse one line of 3AC text into an Instruction.
+    Lines that do not round-trip exactly are kept verbatim as RAW instructions.
+    """
+    for kind, pattern in _PATTERNS:
+        match = pattern.match(line)
+        if not match:
+            continue
+        if kind == 'LABEL':
+            instruction = Instruction('LABEL', dst=match.group(1))
+        elif kind in ('GOTO', 'FUNC', 'PARAM', 'ENDFUNC'):
+            instruction = Instruction(kind, dst=match.group(1))
+        elif kind == 'IF_GOTO':
+            instruction = Instruction('IF_GOTO', dst=match.group(2), a=match.group(1))
+        elif kind == 'PRINT':
+            instruction = Instruction('PRINT', a=match.group(1))
+        elif kind == 'BINARY':
+            instruction = Instruction(BINARY_OPERATORS[match.group(3)], dst=match.group(1),
+                                      a=match.group(2), b=match.group(4))
+        else:
+            instruction = Instruction('COPY', dst=match.group(1), a=match.group(2))
+        if instruction.format() == line:
+            return instruction
+        break
+    return Instruction('RAW', a=line)
+
+
+def parse_code(lines):
+    """Parse a list of 3AC lines, as produced by CodeGenerator.code."""
+    return [parse_instruction(line) for line in lines]
+
+
+def format_code(instructions):
+    """Render a list of Instructions back to 3AC lines."""
+    return [instruction.format() for instruction in instructions]
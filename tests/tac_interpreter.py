@@ -0,0 +1,75 @@
+"""A small 3AC interpreter, used to check that transformed code still computes the same thing."""
+import math
+
+from tac import OPERATOR_SYMBOLS, parse_code
+
+
+def value(operand, env):
+    if operand.startswith('"'):
+        return operand[1:-1]
+    if operand.replace('.', '', 1).isdigit():
+        return float(operand) if '.' in operand else int(operand)
+    return env[operand]
+
+
+def arithmetic(op, x, y):
+    if op == 'ADD':
+        return x + y
+    elif op == 'SUB':
+        return x - y
+    elif op == 'MUL':
+        return x * y
+    elif isinstance(x, float) or isinstance(y, float):
+        return x / y if op == 'DIV' else math.fmod(x, y)
+    quotient = abs(x) // abs(y) * (1 if (x < 0) == (y < 0) else -1)
+    return quotient if op == 'DIV' else x - y * quotient
+
+
+def execute(lines):
+    """
+    Run 3AC and return what it prints: the top-level code first, then the body of
+    every function with its parameters bound to 3, 4, 5, ...
+    """
+    code = parse_code(lines)
+    labels = {instruction.dst: index for index, instruction in enumerate(code) if instruction.op == 'LABEL'}
+    function_end = {}
+    stack = []
+    for index, instruction in enumerate(code):
+        if instruction.op == 'FUNC':
+            stack.append(index)
+        elif instruction.op == 'ENDFUNC':
+            function_end[stack.pop()] = index
+
+    def run(pc, env, in_function):
+        output = []
+        arguments = iter(range(3, 100))
+        while pc < len(code):
+            instruction = code[pc]
+            pc += 1
+            if instruction.op == 'FUNC':
+                pc = function_end[pc - 1] + 1
+            elif instruction.op == 'ENDFUNC':
+                if in_function:
+                    break
+            elif instruction.op == 'PARAM':
+                env[instruction.dst] = next(arguments)
+            elif instruction.op == 'GOTO':
+                pc = labels[instruction.dst]
+            elif instruction.op == 'IF_GOTO':
+                if value(instruction.a, env):
+                    pc = labels[instruction.dst]
+            elif instruction.op == 'PRINT':
+                output.append(value(instruction.a, env))
+            elif instruction.op == 'COPY':
+                env[instruction.dst] = value(instruction.a, env)
+            elif instruction.op in OPERATOR_SYMBOLS:
+                env[instruction.dst] = arithmetic(instruction.op, value(instruction.a, env),
+                                                  value(instruction.b, env))
+            elif instruction.op == 'RAW':
+                raise AssertionError(f"Cannot execute {instruction.a!r}")
+        return output
+
+    printed = {None: run(0, {}, False)}
+    for start in function_end:
+        printed[code[start].dst] = run(start + 1, {}, True)
+    return printed
@@ -0,0 +1,70 @@
+import pytest
+
+import parser as pr
+from lexer import Lexer
+from parallel_codegen import CompiledUnit, compile_unit, generate_parallel, link, number_template, split_units
+from semantic_analyser import CodeGenerator
+
+
+def make_program(functions):
+    parts = []
+    for i in range(functions):
+        parts.append(f"FR int wtl_g{i} = {i} * 2 + 1;")
+        parts.append(f"Brew int wtl_f{i}(int wtl_a, float wtl_b) {{\n"
+                     f"  FR int wtl_x = wtl_a * {i} - (wtl_a + 3) / 2;\n"
+                     f"  spit_it_out wtl_x * wtl_b;\n"
+                     f"}}")
+    parts.append("Brew int wtl_h(int wtl_a) { spit_it_out wtl_a + 1; }")
+    parts.append("Brew int wtl_k() { spit_it_out 7 * 3; }")
+    parts.append("spit_it_out 4 * 5 + 1;")
+    ast = pr.Parser(Lexer("\n".join(parts)).tokenize()).parse()
+    # String literals that look like temps and labels must come through unchanged
+    ast.insert(0, pr.PrintNode(pr.StringNode("t1 label2 end_if_3")))
+    for node in ast:
+        if isinstance(node, pr.FuncDeclNode):
+            node.body.insert(1, pr.PrintNode(pr.StringNode(f"{node.func_name} t2 = label1")))
+    return ast
+
+
+def serial(ast):
+    code_generator = CodeGenerator()
+    code_generator.generate(ast)
+    return code_generator.code
+
+
+@pytest.mark.parametrize('workers', [1, 2, 4])
+def test_parallel_output_matches_serial(workers):
+    ast = make_program(12)
+    assert 'print "wtl_f11 t2 = label1"' in serial(ast)
+    assert "\n".join(generate_parallel(ast, max_workers=workers)) == "\n".join(serial(ast))
+
+
+def test_link_renumbers_units_like_one_generator():
+    ast = make_program(3)
+    units = [compile_unit(unit) for unit in split_units(ast)]
+    assert len(units) == 9
+    assert link(units) == serial(ast)
+    # Linking twice gives the same result; units are not changed by it
+    assert link(units) == serial(ast)
+
+
+def test_string_literals_are_not_renumbered():
+    code = ['t1 = "t1 {label2}" + t2', 'goto label2', 'end_if_4:', 'print "end_if_4 {}"']
+    unit = CompiledUnit(number_template(code), len(code), 2, 3)
+    assert unit.renumbered(10, 5) == ['t11 = "t1 {label2}" + t12', 'goto label7', 'end_if_9:', 'print "end_if_4 {}"']
+    assert unit.renumbered(0, 0) == ['t1 = "t1 {label2}" + t2', 'goto label2', 'end_if_4:', 'print "end_if_4 {}"']
+    assert CompiledUnit('', 0, 0, 0).renumbered(3, 4) == []
+
+
+def test_string_literals_containing_field_markers():
+    nodes = make_program(1)[:2]
+    nodes.append(pr.PrintNode(pr.StringNode("t1 \x01 label2 \x02 {0}")))
+    unit = compile_unit(nodes)
+    assert link([unit]) == serial(nodes)
+    assert unit.renumbered(5, 0)[-1] == 'print "t1 \x01 label2 \x02 {0}"'
+
+
+def test_small_programs():
+    assert generate_parallel([], max_workers=2) == []
+    ast = make_program(0)
+    assert generate_parallel(ast[:1], max_workers=2) == serial(ast[:1])
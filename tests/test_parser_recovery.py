@@ -0,0 +1,110 @@
+import pytest
+
+import parser as pr
+from diagnostics import LineIndex
+from lexer import Lexer, LexerError
+
+
+def parse(source):
+    lexer = Lexer(source, recover=True)
+    parser = pr.Parser(lexer.tokenize(), recover=True, line_index=lexer.line_index)
+    ast = parser.parse()
+    return ast, lexer.errors, parser.errors
+
+
+def locations(errors):
+    return [(error.line, error.column, error.message) for error in errors]
+
+
+def test_reports_every_error_in_one_pass():
+    ast, lexer_errors, parser_errors = parse(
+        "FR int wtl_x = 7;\n"
+        "wtl_x = wtl_x + 1;\n"
+        "FR int wtl_y = @ 3;\n"
+        "spit_it_out wtl_x + ;\n"
+        "FR int wtl_z = 4\n"
+        "spit_it_out 2;\n"
+        "= = wtl_q;\n"
+        "FR int wtl_w = (1 + 2;\n"
+        "FR int")
+    assert locations(lexer_errors) == [(3, 16, "Your Syntax is sus T_T: @")]
+    assert locations(parser_errors) == [
+        (4, 21, "Syntax error: unexpected token ';'"),
+        (6, 1, "Expected ';' at the end of variable declaration"),
+        (7, 1, "Syntax error: unexpected token '='"),
+        (8, 22, "Expected 'RPAREN', but found ';'"),
+        (9, 7, "Expected variable name"),
+    ]
+    # The statements around the errors are still parsed
+    assert [type(node).__name__ for node in ast] == ['VarDeclNode', 'AssignmentNode', 'VarDeclNode', 'PrintNode']
+
+
+def test_valid_statements_report_nothing():
+    ast, lexer_errors, parser_errors = parse(
+        "FR int wtl_x = 2;\n"
+        "FR int wtl_y = 2 + wtl_x - wtl_x * 3;\n"
+        "wtl_y = wtl_x + wtl_y;\n"
+        "spit_it_out wtl_y - wtl_x;")
+    assert lexer_errors == parser_errors == []
+    declaration, assignment, output = ast[1:]
+    assert isinstance(declaration.expr, pr.SubNode) and isinstance(declaration.expr.left.right, pr.IdentifierNode)
+    assert assignment.lhs == 'wtl_y' and isinstance(assignment.rhs, pr.AddNode)
+    assert isinstance(output.expr.right, pr.IdentifierNode)
+
+
+def test_adjacent_invalid_characters_are_one_error():
+    _, lexer_errors, _ = parse("FR int wtl_x = 1 $$$ ;")
+    assert [(error.message, error.start, error.end) for error in lexer_errors] == [
+        ("Your Syntax is sus T_T: $$$", 17, 20)]
+
+
+def test_broken_block_is_skipped_to_its_matching_brace():
+    ast, _, parser_errors = parse(
+        "Brew int wtl_g( {\n"
+        "  FR int wtl_q = ;\n"
+        "}\n"
+        "spit_it_out 1;")
+    assert locations(parser_errors) == [
+        (1, 17, "Expected parameter type (e.g., int, float)"),
+        (2, 18, "Syntax error: unexpected token ';'"),
+    ]
+    assert [type(node).__name__ for node in ast] == ['PrintNode']
+
+
+def test_errors_inside_function_bodies_keep_the_function():
+    ast, _, parser_errors = parse(
+        "Brew int wtl_f(int wtl_a, float wtl_b) {\n"
+        "  FR int wtl_x = ;\n"
+        "  spit_it_out 3;\n"
+        "}\n"
+        "FR int wtl_y = 2;")
+    assert locations(parser_errors) == [(2, 18, "Syntax error: unexpected token ';'")]
+    function, declaration = ast
+    assert function.params == [('int', 'wtl_a'), ('float', 'wtl_b')]
+    assert len(function.body) == 1
+    assert declaration.var_name == 'wtl_y'
+
+
+def test_end_of_input_is_a_parser_error():
+    for source in ("spit_it_out", "FR int wtl_x =", "Brew int wtl_f(", "spit_it_out (1 + 2"):
+        with pytest.raises(pr.ParserError):
+            pr.Parser(Lexer(source).tokenize()).parse()
+        _, _, parser_errors = parse(source)
+        assert len(parser_errors) == 1
+        assert parser_errors[0].start == len(source)
+
+
+def test_without_recovery_the_first_error_raises():
+    with pytest.raises(LexerError, match="line 2, column 12"):
+        Lexer("FR int\n wtl_x = 7 $;").tokenize()
+    with pytest.raises(pr.ParserError):
+        pr.Parser(Lexer("spit_it_out ; spit_it_out ;").tokenize()).parse()
+
+
+def test_line_index_is_built_on_first_use():
+    lexer = Lexer("FR int wtl_x = 1;\nspit_it_out wtl_x;\n", recover=True)
+    lexer.tokenize()
+    assert lexer.line_index._line_starts is None  # No errors, so no positions were needed
+    assert lexer.line_index.location(18) == (2, 1)
+    assert lexer.line_index.line_starts == [0, 18, 37]
+    assert LineIndex("").location(5) == (1, 1)
@@ -0,0 +1,125 @@
+import pytest
+
+import parser as pr
+from lexer import Lexer
+from pass_manager import (AnalysisManager, CFGAnalysis, DeadCodeElimination, Pass, PassError, PRESERVE_ALL,
+                          build_pipeline)
+from semantic_analyser import CodeGenerator
+from tac import parse_code
+from tac_interpreter import execute
+
+PROGRAMS = [
+    # Top-level code after a leading function
+    "Brew int wtl_f(int wtl_a) { spit_it_out wtl_a + 1; } FR int wtl_x = 5; spit_it_out wtl_x + 2;",
+    # Functions back to back, between top-level statements
+    "FR int wtl_x = 7 * 3 - 4 / 2;\n"
+    "Brew int wtl_f(int wtl_a, int wtl_b) { FR int wtl_c = wtl_a * 2 + (wtl_b) / 3; spit_it_out wtl_c; }\n"
+    "Brew int wtl_g(int wtl_a) { spit_it_out wtl_a - 1; }\n"
+    "Brew int wtl_h() { spit_it_out 9 / 4; }\n"
+    "spit_it_out wtl_x * (wtl_x + 1);\n"
+    "spit_it_out 9 / 2;",
+    # Floats, integer division and chains of copies
+    "FR float wtl_y = 7.5 / 2 + 1;\n"
+    "FR int wtl_z = 17 / 5 * (3 + 4) - 1;\n"
+    "FR int wtl_w = wtl_z;\n"
+    "spit_it_out wtl_y * 2;\n"
+    "spit_it_out wtl_w + (wtl_z) / 2;",
+    # Only functions
+    "Brew int wtl_f(int wtl_a) { spit_it_out wtl_a * (2 + 3); } Brew int wtl_g() { spit_it_out 1 + 1; }",
+]
+
+
+def lower(source):
+    code_generator = CodeGenerator()
+    code_generator.generate(pr.Parser(Lexer(source).tokenize()).parse())
+    return code_generator.code
+
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_optimisation_levels_print_the_same(source):
+    code = lower(source)
+    expected = execute(code)
+    for level in (1, 2):
+        optimised = build_pipeline(level, verify=True).run(code)
+        assert execute(optimised) == expected
+        assert len(optimised) <= len(code)
+
+
+def test_top_level_code_after_functions_is_kept():
+    code = lower(PROGRAMS[0])
+    assert build_pipeline(2).run(code) == [
+        'func wtl_f', 'param wtl_a', 't1 = wtl_a + 1', 'print t1', 'endfunc wtl_f',
+        'wtl_x = 5', 't3 = wtl_x + 2', 'print t3']
+
+
+def test_cfg_entries_skip_leading_and_adjacent_functions():
+    code = parse_code(['func f', 'print 1', 'endfunc f', 'func g', 'print 2', 'endfunc g',
+                       'x = 1', 'func h', 'endfunc h', 'print x'])
+    cfg = CFGAnalysis().run(code, None)
+    assert cfg.blocks == [(0, 3), (3, 6), (6, 7), (7, 9), (9, 10)]
+    assert sorted(cfg.entries) == [0, 1, 2, 3]
+    assert cfg.successors == [[], [], [4], [], []]
+    assert cfg.reachable() == {0, 1, 2, 3, 4}
+
+
+def test_folding_matches_run_time_arithmetic():
+    code = ['t1 = 7 / 2', 'print t1', 't2 = 7 % 3', 'print t2', 't3 = 7.5 / 2', 'print t3',
+            't4 = 9 % 2.5', 'print t4', 't5 = t1 * t2', 'print t5', 't6 = 1 / 0', 'print t6']
+    optimised = build_pipeline(2, verify=True).run(code)
+    assert optimised == ['print 3', 'print 1', 'print 3.75', 'print 1.5', 'print 3', 't6 = 1 / 0', 'print t6']
+
+
+def test_dead_temporaries_are_removed():
+    code = ['t1 = 2 * 3', 't2 = wtl_x + t1', 'wtl_y = 4', 't3 = wtl_y', 't4 = t3 + 1', 'print wtl_y']
+    assert build_pipeline(1).run(code) == ['wtl_y = 4', 'print wtl_y']
+    assert build_pipeline(0).run(code) == code
+
+
+def test_report_shows_analysis_reuse():
+    pipeline = build_pipeline('-O2')
+    pipeline.run(lower(PROGRAMS[1]))
+    report = pipeline.report()
+    assert [line.split()[0] for line in report.splitlines()[1:7]] == [
+        'copy-propagation', 'constant-folding', 'copy-propagation', 'dead-code-elimination',
+        'unreachable-code-elimination', 'dead-code-elimination']
+    computed = {line.split()[1]: line.split()[-1] for line in report.splitlines() if line.startswith('analysis')}
+    assert computed == {'cfg': '3x', 'liveness': '2x', 'symbols': '3x', 'types': '1x'}
+
+
+def test_invalidation_drops_dependent_analyses():
+    code = parse_code(['t1 = 1', 'print t1'])
+    analyses = AnalysisManager()
+    analyses.get('liveness', code)
+    analyses.get('types', code)
+    analyses.invalidate(PRESERVE_ALL)
+    assert set(analyses.cache) == {'cfg', 'liveness', 'types'}
+    analyses.invalidate(('cfg', 'types'))
+    assert set(analyses.cache) == {'cfg', 'types'}
+    analyses.get('liveness', code)
+    analyses.invalidate(('liveness',))  # Liveness is built on the cfg, so it goes too
+    assert analyses.cache == {}
+    assert analyses.stats['cfg'][0] == 1 and analyses.stats['liveness'][0] == 2
+
+
+def test_verify_catches_false_preservation_claims():
+    class DropLabels(Pass):
+        name = 'drop-labels'
+        requires = ('cfg',)
+        preserves = PRESERVE_ALL
+
+        def run(self, code, analyses):
+            return [instruction for instruction in code if instruction.op != 'LABEL']
+
+    code = ['t1 = 1', 'if t1 goto label1', 'print 2', 'label1:', 'print t1']
+    pipeline = build_pipeline(0, verify=True)
+    pipeline.passes = [DeadCodeElimination(), DropLabels()]
+    pipeline.run(['t1 = 1', 'print t1'])  # Nothing to drop, so the claim holds
+    pipeline.records = []
+    with pytest.raises(PassError, match="drop-labels"):
+        pipeline.run(code)
+
+
+def test_invalid_levels():
+    for level in (3, '-O3', 'fast'):
+        with pytest.raises(PassError):
+            build_pipeline(level)
@@ -0,0 +1,102 @@
+import struct
+
+import pytest
+
+import parser as pr
+import serialiser
+from lexer import Lexer
+from semantic_analyser import CodeGenerator
+from tac import parse_instruction
+
+SOURCE = (
+    'FR int wtl_x = 7;\n'
+    'Brew int wtl_f(int wtl_a, float wtl_b) {\n'
+    '  FR int wtl_y = wtl_a * 2 - (wtl_a + 3) / 4;\n'
+    '  spit_it_out wtl_y;\n'
+    '}\n'
+    'spit_it_out "t1 é label2";\n'
+)
+
+
+@pytest.fixture
+def program():
+    tokens = Lexer(SOURCE).tokenize()
+    ast = pr.Parser(tokens).parse()
+    code_generator = CodeGenerator()
+    code_generator.generate(ast)
+    return tokens, ast, code_generator.code
+
+
+def same_tree(a, b):
+    if isinstance(a, (list, tuple)):
+        return type(a) is type(b) and len(a) == len(b) and all(same_tree(x, y) for x, y in zip(a, b))
+    if hasattr(a, '__dict__'):
+        return type(a) is type(b) and vars(a).keys() == vars(b).keys() and all(
+            same_tree(value, getattr(b, field)) for field, value in vars(a).items())
+    return a == b
+
+
+def test_round_trip(program):
+    tokens, ast, code = program
+    with serialiser.loads(serialiser.dumps(tokens, ast, code)) as image:
+        assert list(image.tokens()) == tokens
+        assert image.token(3) == tokens[3]
+        assert same_tree(image.ast(), ast)
+        assert image.ast()[1].params == [('int', 'wtl_a'), ('float', 'wtl_b')]
+        assert image.code() == code
+        assert list(image.instructions()) == [parse_instruction(line) for line in code]
+
+
+def test_node_views_decode_lazily(program):
+    tokens, ast, code = program
+    with serialiser.loads(serialiser.dumps(ast=ast)) as image:
+        declaration, function, statement = image.roots()
+        assert function.node_type is pr.FuncDeclNode
+        assert function.func_name == 'wtl_f'
+        assert function.params == [('int', 'wtl_a'), ('float', 'wtl_b')]
+        body = function.body
+        assert isinstance(body[0], serialiser.NodeView)
+        assert body[0].expr.node_type is pr.SubNode
+        assert statement.expr == '"t1 é label2"'
+        assert same_tree(declaration.materialize(), ast[0])
+        with pytest.raises(AttributeError):
+            declaration.body
+
+
+def test_load_from_disk(program, tmp_path):
+    tokens, ast, code = program
+    path = tmp_path / "program.wtlb"
+    serialiser.dump(path, tokens, ast, code)
+    image = serialiser.load(path)
+    try:
+        assert image.token_count == len(tokens)
+        assert image.instruction_count == len(code)
+        assert same_tree(image.ast(), ast)
+        assert image.code() == code
+    finally:
+        image.close()
+
+
+def test_words_are_little_endian(program, monkeypatch):
+    tokens, ast, code = program
+    data = serialiser.dumps(tokens, ast, code)
+    with serialiser.loads(data) as image:
+        count, offset, size = image._sections[serialiser.ROOTS]
+        assert list(struct.unpack_from(f'<{count}I', data, offset)) == list(image._roots)
+    # The path taken on big-endian hosts writes and reads the same bytes
+    monkeypatch.setattr(serialiser, 'NATIVE_WORDS', False)
+    assert serialiser.dumps(tokens, ast, code) == data
+    with serialiser.loads(data) as image:
+        assert same_tree(image.ast(), ast)
+        assert list(image.tokens()) == tokens
+        assert image.code() == code
+
+
+def test_rejects_malformed_images(program):
+    data = serialiser.dumps(*program)
+    with pytest.raises(serialiser.SerialisationError):
+        serialiser.loads(b'NOPE' + data[4:])
+    with pytest.raises(serialiser.SerialisationError):
+        serialiser.loads(data[:serialiser.HEADER.size - 1])
+    with pytest.raises(serialiser.SerialisationError):
+        serialiser.loads(data[:len(data) // 2])
@@ -0,0 +1,177 @@
+import os
+import random
+import re
+
+import pytest
+
+import parser as pr
+from lexer import Lexer
+from pass_manager import build_pipeline
+from semantic_analyser import CodeGenerator
+from tac_interpreter import execute
+from watch import IncrementalBuilder, Watcher, common_prefix, common_suffix
+
+_NAME = re.compile(r'"[^"]*"|\b(t|label|end_if_)(\d+(?:_\d+)?)\b')
+
+
+def canonical(code):
+    """Rename temps and labels in order of first appearance, so differently numbered code compares equal."""
+    names = {}
+
+    def rename(match):
+        if match.group(1) is None:
+            return match.group(0)
+        return names.setdefault(match.group(0), f"{match.group(1)}{len(names) + 1}")
+
+    return [_NAME.sub(rename, line) for line in code]
+
+
+def full_build(source):
+    code_generator = CodeGenerator()
+    code_generator.generate(pr.Parser(Lexer(source).tokenize()).parse())
+    return code_generator.code
+
+
+def make_lines(count):
+    lines = []
+    for i in range(count):
+        if i % 10 == 0:
+            lines.append(f"Brew int wtl_f{i}(int wtl_a) {{ FR int wtl_l = wtl_a * {i} + 2; spit_it_out wtl_l; }}")
+        elif i % 3 == 0:
+            lines.append(f"spit_it_out wtl_v{i - 1} * ({i} + wtl_v{i - 2});")
+        else:
+            lines.append(f"FR int wtl_v{i} = {i} * 3 + {i % 7} / 2;")
+    return lines
+
+
+def test_common_prefix_and_suffix():
+    a = "x" * 10000 + "abc" + "y" * 9000
+    b = "x" * 10000 + "abXc" + "y" * 9000
+    assert common_prefix(a, b) == 10002
+    assert common_suffix(a, b, len(a) - 10002) == 9001
+    assert common_prefix(a, a + "z") == len(a)
+    assert common_suffix("ab", "b", 1) == 1
+    assert common_prefix("", "abc") == common_suffix("", "abc", 0) == 0
+
+
+def test_edits_relower_only_changed_units_and_their_users():
+    lines = make_lines(40)
+    builder = IncrementalBuilder()
+    first = builder.build("a.wtl", "\n".join(lines))
+    assert (first.relowered, first.reused) == (40, 0)
+    assert canonical(first.code) == canonical(full_build("\n".join(lines)))
+
+    lines[7] = "FR int wtl_v7 = 100 / 3;"  # Used by the print on line 9
+    second = builder.build("a.wtl", "\n".join(lines))
+    assert (second.relowered, second.reused) == (2, 38)
+    assert canonical(second.code) == canonical(full_build("\n".join(lines)))
+    # Units that were not relowered keep their temp names
+    assert first.code[:20] == second.code[:20]
+
+    third = builder.build("a.wtl", "\n\n".join(lines))  # Whitespace only
+    assert (third.relowered, third.reused) == (0, 40)
+    assert third.code == second.code
+
+
+def test_errors_leave_the_previous_build_in_place():
+    builder = IncrementalBuilder()
+    source = "FR int wtl_x = 1;\nFR int wtl_y = 2;\nspit_it_out wtl_x;"
+    good = builder.build("a.wtl", source)
+
+    broken = builder.build("a.wtl", source.replace("wtl_y = 2", "wtl_y = @"))
+    assert broken.text is None and len(broken.errors) == 2
+    assert [error.line for error in broken.errors] == [2, 2]
+
+    duplicate = builder.build("a.wtl", source.replace("wtl_y", "wtl_x"))
+    assert duplicate.text is None
+    assert [str(error) for error in duplicate.errors] == ["Variable 'wtl_x' already declared!"]
+
+    # Renaming the declaration in place is not a duplicate
+    renamed = builder.build("a.wtl", source.replace("wtl_x", "wtl_z"))
+    assert renamed.errors == []
+    assert canonical(builder.build("a.wtl", source).code) == canonical(good.code) == canonical(full_build(source))
+
+
+@pytest.mark.parametrize('opt_level', [0, 2])
+def test_random_edits_match_full_builds(opt_level):
+    rng = random.Random(opt_level)
+    lines = make_lines(60)
+    builder = IncrementalBuilder(opt_level)
+    builder.build("a.wtl", "\n".join(lines))
+    for _ in range(60):
+        edited = list(lines)
+        choice = rng.random()
+        position = rng.randrange(len(edited))
+        if choice < 0.3:
+            edited.insert(rng.randrange(len(edited)), edited.pop(position))
+        elif choice < 0.6:
+            edited[position] = edited[position].replace("* 3", "* 3 - 1", 1).replace("+ 2", "+ 2 * 5", 1)
+        elif choice < 0.8:
+            edited.insert(position, f"spit_it_out {rng.randint(1, 99)} + 4;")
+        elif edited[position].startswith("spit_it_out"):
+            edited.pop(position)
+        source = "\n".join(edited)
+        result = builder.build("a.wtl", source)
+        if result.errors:
+            continue  # Moved a declaration above a duplicate, or the like
+        lines = edited
+        expected = full_build(source)
+        if opt_level:
+            try:
+                printed = execute(expected)
+            except KeyError:
+                printed = None  # Moved a use above its declaration
+            if printed is not None:
+                assert execute(result.code) == printed
+            assert len(result.code) <= len(build_pipeline(opt_level).run(expected))
+        else:
+            assert canonical(result.code) == canonical(expected)
+
+
+def test_optimised_units_keep_top_level_code_after_functions():
+    source = "Brew int wtl_f(int wtl_a) { spit_it_out wtl_a + 1; } FR int wtl_x = 5; spit_it_out wtl_x + 2;"
+    result = IncrementalBuilder(2).build("a.wtl", source)
+    assert execute(result.code) == execute(full_build(source))
+    assert 'wtl_x = 5' in result.code
+
+
+def test_watcher_writes_tac_files(tmp_path):
+    source = tmp_path / "main.wtl"
+    source.write_text("FR int wtl_x = 2 * 3;\nspit_it_out wtl_x;\n", encoding='utf-8')
+    watcher = Watcher(str(tmp_path), IncrementalBuilder(2))
+    results = watcher.poll()
+    assert [result.errors for result in results] == [[]]
+    assert (tmp_path / "main.tac").read_text(encoding='utf-8') == "wtl_x = 6\nprint wtl_x\n"
+    assert watcher.poll() == []  # Nothing changed
+    source.unlink()
+    assert watcher.poll() == [] and watcher.builder.files == {}
+
+
+def test_watcher_reports_broken_files_and_keeps_going(tmp_path):
+    bad = tmp_path / "bad.wtl"
+    good = tmp_path / "good.wtl"
+    bad.write_bytes(b"FR int wtl_x = 1;\n\xff\xfe")
+    good.write_text("FR int wtl_x = 2;\nspit_it_out 2 + wtl_x;\n", encoding='utf-8')
+    watcher = Watcher(str(tmp_path), IncrementalBuilder())
+    results = {os.path.basename(result.path): result for result in watcher.poll()}
+    assert results['good.wtl'].errors == []
+    assert [type(error) for error in results['bad.wtl'].errors] == [UnicodeDecodeError]
+    assert "bad.wtl: 1 error(s)" in str(results['bad.wtl'])
+    assert not (tmp_path / "bad.tac").exists()
+    assert (tmp_path / "good.tac").read_text(encoding='utf-8').endswith("print t2_1\n")
+
+    bad.write_text("FR int wtl_y = 3;\n", encoding='utf-8')
+    assert [result.errors for result in watcher.poll()] == [[]]
+    assert (tmp_path / "bad.tac").exists()
+
+
+def test_watcher_reports_crashing_builds(tmp_path, monkeypatch):
+    (tmp_path / "a.wtl").write_text("spit_it_out 1;", encoding='utf-8')
+    watcher = Watcher(str(tmp_path), IncrementalBuilder())
+
+    def crash(path, source_code=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(watcher.builder, 'build', crash)
+    [result] = watcher.poll()
+    assert result.text is None and [str(error) for error in result.errors] == ["boom"]
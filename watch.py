@@ -0,0 +1,470 @@
+"""
+Watch a source tree and rebuild 3AC for every changed .wtl file.
+Usage: python watch.py SOURCE_DIR [--interval SECONDS] [-O LEVEL] [--once]
+
+Only the region of a file around an edit is lexed again. Each top-level
+statement and function in it is fingerprinted and matched against the previous
+build. Unchanged units keep their checked, lowered and optimised 3AC, so only
+edited units (and the units that use the symbols they define) go through the
+SemanticChecker, CodeGenerator and optimisation pipeline again.
+
+Every unit's temps and labels are namespaced by the unit (t3 of unit 12 is
+written t12_3), so an edit never renumbers the rest of the file. The names
+therefore differ from a whole-program CodeGenerator build, but the code
+computes the same thing.
+"""
+import argparse
+import contextlib
+import hashlib
+import os
+import sys
+import time
+
+import parser as pr
+from lexer import Lexer
+from parallel_codegen import namespace_numbers
+from pass_manager import build_pipeline
+from semantic_analyser import CodeGenerator, SemanticChecker
+
+SOURCE_SUFFIX = '.wtl'
+OUTPUT_SUFFIX = '.tac'
+_COMPARE_BLOCK = 4096  # Characters compared at a time when looking for the edited region
+
+def split_statements(tokens):
+    """
+    Cut a token stream into top-level statements without parsing it: a statement
+    ends at a ';' outside any braces, or at the '}' that closes its outermost block.
+    Yields each statement's list of tokens as soon as it is complete.
+    """
+    segment = []
+    depth = 0
+    for token in tokens:
+        segment.append(token)
+        kind = token[0]
+        if kind == 'LBRACE':
+            depth += 1
+        elif kind == 'RBRACE' and depth:
+            depth -= 1
+            if not depth:
+                yield segment
+                segment = []
+        elif kind == 'SEMICOLON' and not depth:
+            yield segment
+            segment = []
+    if segment:
+        yield segment
+
+
+def common_prefix(a, b):
+    """Length of the longest common prefix of two strings."""
+    limit = min(len(a), len(b))
+    low = 0
+    # Skip equal blocks, then bisect on slices inside the first block that differs
+    while low < limit:
+        size = min(_COMPARE_BLOCK, limit - low)
+        if a[low:low + size] != b[low:low + size]:
+            break
+        low += size
+    high = min(low + _COMPARE_BLOCK, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def common_suffix(a, b, limit):
+    """Length of the longest common suffix of two strings, at most limit characters."""
+    low = 0
+    while low < limit:
+        size = min(_COMPARE_BLOCK, limit - low)
+        if a[len(a) - low - size:len(a) - low] != b[len(b) - low - size:len(b) - low]:
+            break
+        low += size
+    high = min(low + _COMPARE_BLOCK, limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def fingerprint(segment):
+    """Hash the kinds and values of a statement's tokens, ignoring where they sit in the file."""
+    text = "\x00".join(f"{token[0]}\x01{token[1]}" for token in segment)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def unit_symbols(node):
+    """Return the names a top-level statement defines and the names it refers to."""
+    if isinstance(node, pr.FuncDeclNode):
+        # Parameters and locals are private to the function; only its name is visible outside
+        local_defines, local_uses = unit_symbols(node.body)
+        params = {param_name for data_type, param_name in node.params}
+        return {node.func_name}, local_uses - local_defines - params
+    defines = set()
+    uses = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, (list, tuple)):
+            stack.extend(current)
+            continue
+        if not hasattr(current, '__dict__'):
+            continue  # Plain strings such as data types and operators
+        if isinstance(current, pr.VarDeclNode):
+            defines.add(current.var_name)
+        elif isinstance(current, pr.FuncDeclNode):
+            inner_defines, inner_uses = unit_symbols(current)
+            defines |= inner_defines
+            uses |= inner_uses
+            continue
+        elif isinstance(current, pr.IdentifierNode):
+            uses.add(current.name)
+        elif isinstance(current, (pr.VarUseNode, pr.ScanStmtNode)):
+            uses.add(current.var_name)
+        elif isinstance(current, pr.AssignmentNode):
+            uses.add(current.lhs)
+        stack.extend(vars(current).values())
+    return defines, uses
+
+
+class UnitRecord:
+    def __init__(self, key, nodes, namespace, declared, defines, uses):
+        """
+        A top-level statement and the 3AC it was lowered to.
+        :param key: Fingerprint of the statement's tokens.
+        :param nodes: The parsed statement(s); usually exactly one node.
+        :param namespace: Number that makes the unit's temp and label names unique in its file.
+        :param declared: Names the SemanticChecker saw the statement declare.
+        :param defines: Names the statement defines.
+        :param uses: Names the statement refers to.
+        """
+        self.key = key
+        self.nodes = nodes
+        self.namespace = namespace
+        self.declared = declared
+        self.defines = defines
+        self.uses = uses
+        self.text = None  # The unit's 3AC, one '\n'-terminated line per instruction, once lowered
+
+
+class FileState:
+    def __init__(self, source_code=''):
+        """Everything kept from the last successful build of a file."""
+        self.source_code = source_code
+        # End offset of each top-level statement. Those before split are stored as offsets from
+        # the start of the file and the rest as distances from its end, so an edit only has to
+        # convert the statements between the previous edit and this one.
+        self.ends = []
+        self.split = 0
+        self.records = []  # The UnitRecord of each top-level statement, in the same order
+        self.texts = []  # The 3AC text of each record, so the output is a single join
+        self.declarations = {}  # name -> number of units declaring it
+        self.users = {}  # name -> set of the UnitRecords that use it
+
+    def end(self, index):
+        """Offset from the start of the file at which the statement at the given index ends."""
+        value = self.ends[index]
+        return value if index < self.split else len(self.source_code) - value
+
+    def count_ends(self, offset):
+        """Number of statements that end at or before the given offset, found by bisection."""
+        low, high = 0, len(self.ends)
+        while low < high:
+            middle = (low + high) // 2
+            if self.end(middle) <= offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def replace(self, source_code, start, stop, ends, records):
+        """
+        Replace statements start to stop (exclusive) with new ones and move to the new source.
+        :param ends: End offsets of the new statements, in the new source.
+        :param records: UnitRecords of the new statements.
+        """
+        length = len(self.source_code)
+        # Statements before the edit keep their offset from the start of the file,
+        # and those after it their distance from the end
+        for index in range(self.split, start):
+            self.ends[index] = length - self.ends[index]
+        for index in range(stop, self.split):
+            self.ends[index] = length - self.ends[index]
+        self.ends[start:stop] = ends
+        self.records[start:stop] = records
+        self.texts[start:stop] = [record.text for record in records]
+        self.split = start + len(ends)
+        self.source_code = source_code
+
+    def add(self, record):
+        for name in record.declared:
+            self.declarations[name] = self.declarations.get(name, 0) + 1
+        for name in record.uses:
+            self.users.setdefault(name, set()).add(record)
+
+    def remove(self, record):
+        for name in record.declared:
+            self.declarations[name] -= 1
+            if not self.declarations[name]:
+                del self.declarations[name]
+        for name in record.uses:
+            self.users[name].discard(record)
+            if not self.users[name]:
+                del self.users[name]
+
+
+class BuildResult:
+    def __init__(self, path, text, relowered, reused, seconds, errors):
+        self.path = path
+        self.text = text  # The whole 3AC output, or None if the build failed
+        self.relowered = relowered
+        self.reused = reused
+        self.seconds = seconds
+        self.errors = errors
+
+    @property
+    def code(self):
+        """The 3AC as a list of lines, or None if the build failed."""
+        return None if self.text is None else self.text.split('\n')[:-1]
+
+    def __str__(self):
+        name = os.path.basename(self.path)
+        if self.errors:
+            return f"{name}: {len(self.errors)} error(s)\n" + "\n".join(f"  {error}" for error in self.errors)
+        return (f"{name}: relowered {self.relowered}/{self.relowered + self.reused} units "
+                f"in {self.seconds * 1000:.2f} ms")
+
+
+class IncrementalBuilder:
+    def __init__(self, opt_level=0):
+        """
+        Rebuilds individual files, reusing work from the previous successful build.
+        :param opt_level: Optimisation level passed to pass_manager.build_pipeline.
+        """
+        self.opt_level = opt_level
+        self.files = {}  # path -> FileState from the last successful build
+        self.namespaces = 0  # Last namespace handed to a unit
+
+    def forget(self, path):
+        self.files.pop(path, None)
+
+    def lower(self, record):
+        """Generate, namespace and optimise the 3AC of one unit."""
+        code_generator = CodeGenerator()
+        code_generator.generate(record.nodes)
+        code = namespace_numbers(code_generator.code, record.namespace)
+        if self.opt_level:
+            # Temps never outlive their unit, so optimising units one by one loses nothing
+            code = build_pipeline(self.opt_level).run(code)
+        record.text = "".join(line + "\n" for line in code)
+
+    def build(self, path, source_code=None):
+        """
+        Build one file and return a BuildResult.
+        :param source_code: The file contents; read from path if omitted.
+        """
+        start = time.perf_counter()
+        if source_code is None:
+            with open(path, encoding='utf-8') as f:
+                source_code = f.read()
+
+        state = self.files.get(path) or FileState()
+        old_source = state.source_code
+        prefix = common_prefix(old_source, source_code)
+        suffix = common_suffix(old_source, source_code, min(len(old_source), len(source_code)) - prefix)
+        delta = len(source_code) - len(old_source)
+        tail = len(old_source) - suffix  # Old offsets from here on hold the same text, moved by delta
+
+        # Statements wholly before the edit are kept as they are, and lexing restarts after them
+        kept = state.count_ends(prefix)
+        if kept and old_source[state.end(kept - 1) - 1] not in ';}':
+            kept -= 1  # An unterminated statement at the end of the file may continue into the edit
+        restart = state.end(kept - 1) if kept else 0
+
+        # The parser and code generator print debugging output for every step
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            lexer = Lexer(source_code, recover=True)
+            segments = []
+            ends = []
+            resume = len(state.ends)
+            for segment in split_statements(lexer.iter_tokens(restart)):
+                segment_end = segment[-1][2] + len(segment[-1][1])
+                segments.append(segment)
+                ends.append(segment_end)
+                # Lexing stops once a statement ends where an old one in the unchanged tail did
+                if segment[-1][0] in ('SEMICOLON', 'RBRACE') and segment_end - delta >= tail:
+                    index = state.count_ends(segment_end - delta) - 1
+                    if index >= kept and state.end(index) == segment_end - delta:
+                        resume = index + 1
+                        break
+            errors = list(lexer.errors)
+
+            # Statements in the edited region are matched to old ones by fingerprint, so
+            # moved or untouched statements are not parsed, checked or lowered again
+            previous = {}
+            for record in state.records[kept:resume]:
+                previous.setdefault(record.key, []).append(record)
+            middle = []
+            fresh = []
+            for segment in segments:
+                key = fingerprint(segment)
+                if previous.get(key):
+                    middle.append(previous[key].pop(0))
+                    continue
+                parser = pr.Parser(segment, recover=True, line_index=lexer.line_index)
+                nodes = parser.parse()
+                errors.extend(parser.errors)
+                checker = SemanticChecker()
+                try:
+                    checker.check(nodes)
+                except Exception as e:
+                    errors.append(e)
+                defines = set()
+                uses = set()
+                for node in nodes:
+                    node_defines, node_uses = unit_symbols(node)
+                    defines |= node_defines
+                    uses |= node_uses
+                self.namespaces += 1
+                record = UnitRecord(key, nodes, self.namespaces, set(checker.symbol_table.table), defines, uses)
+                middle.append(record)
+                fresh.append(record)
+            removed = [record for leftovers in previous.values() for record in leftovers]
+
+            # Declarations are counted across the file, so a duplicate is found without
+            # checking every other statement again
+            declared = {}
+            for record in removed:
+                for name in record.declared:
+                    declared[name] = declared.get(name, 0) - 1
+            for record in fresh:
+                for name in record.declared:
+                    declared[name] = declared.get(name, 0) + 1
+            for name, change in declared.items():
+                if change > 0 and state.declarations.get(name, 0) + change > 1:
+                    errors.append(Exception(f"Variable '{name}' already declared!"))
+            if errors:
+                errors.sort(key=lambda error: getattr(error, 'start', len(source_code)))
+                return BuildResult(path, None, 0, 0, time.perf_counter() - start, errors)
+
+            # Units that use a symbol whose definition was removed or edited are lowered again
+            changed_symbols = set()
+            for record in removed + fresh:
+                changed_symbols |= record.defines
+            dependents = set()
+            for name in changed_symbols:
+                dependents |= state.users.get(name, set())
+            dependents.difference_update(removed)
+            for record in fresh:
+                self.lower(record)
+            stale = False  # Whether a dependent's 3AC changed, so its entry in texts must be replaced
+            for record in dependents:
+                text = record.text
+                self.lower(record)
+                stale = stale or record.text != text
+
+        for record in removed:
+            state.remove(record)
+        for record in fresh:
+            state.add(record)
+        state.replace(source_code, kept, resume, ends, middle)
+        if stale:
+            state.texts = [record.text for record in state.records]
+        self.files[path] = state
+        text = "".join(state.texts)
+        relowered = len(fresh) + len(dependents)
+        return BuildResult(path, text, relowered, len(state.records) - relowered, time.perf_counter() - start, [])
+
+
+class Watcher:
+    def __init__(self, root, builder, interval=0.5):
+        """
+        Polls a directory tree for .wtl files whose size or modification time changed.
+        :param root: Directory to watch.
+        :param builder: IncrementalBuilder used for rebuilds.
+        :param interval: Seconds between polls.
+        """
+        self.root = root
+        self.builder = builder
+        self.interval = interval
+        self.stamps = {}  # path -> (mtime_ns, size)
+
+    def sources(self):
+        stack = [self.root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.name.endswith(SOURCE_SUFFIX):
+                            try:
+                                stat = entry.stat()
+                            except OSError:
+                                continue  # Deleted since the scan listed it
+                            yield entry.path, (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                continue  # Directory removed while it was being scanned; its files count as deleted
+
+    def poll(self):
+        """Rebuild every file that changed since the last poll and return the BuildResults."""
+        results = []
+        seen = set()
+        for path, stamp in self.sources():
+            seen.add(path)
+            if self.stamps.get(path) == stamp:
+                continue
+            self.stamps[path] = stamp
+            start = time.perf_counter()
+            try:
+                result = self.builder.build(path)
+                if result.text is not None:
+                    with open(path[:-len(SOURCE_SUFFIX)] + OUTPUT_SUFFIX, 'w', encoding='utf-8') as f:
+                        f.write(result.text)
+            except Exception as e:
+                # One unreadable or crashing file must not end watch mode for the others
+                result = BuildResult(path, None, 0, 0, time.perf_counter() - start, [e])
+            results.append(result)
+        for path in set(self.stamps) - seen:
+            del self.stamps[path]
+            self.builder.forget(path)
+        return results
+
+    def run(self, on_result=print):
+        """Poll forever, reporting every rebuild, until interrupted."""
+        while True:
+            for result in self.poll():
+                on_result(result)
+            time.sleep(self.interval)
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description="Rebuild WhatTheLang sources as they change.")
+    arguments.add_argument('root', help="directory containing .wtl sources")
+    arguments.add_argument('--interval', type=float, default=0.5, help="seconds between polls")
+    arguments.add_argument('-O', dest='opt_level', type=int, choices=(0, 1, 2), default=0,
+                           help="optimisation level")
+    arguments.add_argument('--once', action='store_true', help="build once and exit")
+    options = arguments.parse_args(argv)
+
+    watcher = Watcher(options.root, IncrementalBuilder(options.opt_level), options.interval)
+    if options.once:
+        results = watcher.poll()
+        for result in results:
+            print(result)
+        return 1 if any(result.errors for result in results) else 0
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())